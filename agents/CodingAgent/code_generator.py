@@ -1,4 +1,3 @@
-import json
 from typing import List, Optional, Union, Dict, Literal, Type, Tuple
 
 from config import Config
@@ -12,8 +11,10 @@ from llms import (
     AnthropicDecodingArguments,
 )
 from llms.base_llm import BaseLLM
+from llms.retry import RetryPolicy
 from tools import ReadCode
 from utils.llm_utils import get_request_tokens
+from utils.state_digest import compact_json
 
 
 class CodeGenerator:
@@ -48,6 +49,9 @@ class CodeGenerator:
         self.output_tokens = 0
         self.plan = None
         self.max_retries = max_retries
+        self.retry_policy = RetryPolicy.from_config(
+            config, max_attempts=max_retries + 1
+        )
 
         self.read_code_tool = ReadCode(file_path="")
 
@@ -73,7 +77,7 @@ class CodeGenerator:
             {"role": "system", "content": self.system_prompt},
             {
                 "role": "user",
-                "content": f"The plan for the problem statement is: {json.dumps(plan, indent=4)}",
+                "content": f"The plan for the problem statement is: {compact_json(plan)}",
             },
             {
                 "role": "user",
@@ -81,24 +85,14 @@ class CodeGenerator:
             },
         ]
 
-        attempts = 0
-        while True:
-            try:
-                attempts += 1
-                response = self.llm.chat(
-                    messages=messages,
-                    decoding_args=self.decoding_args,
-                )
-                self.input_tokens, self.output_tokens = get_request_tokens(
-                    response=response, model=self.model
-                )
-                return response["content"]
-            except Exception as e:
-                logger.error(
-                    f"Error in CodePlanning.run: {e}. Retries left = {self.max_retries-attempts}"
-                )
-                if attempts > self.max_retries:
-                    logger.critical(
-                        f"Max retries reached in CodePlanning.run: {e}. Aborting."
-                    )
-                    raise e
+        def attempt() -> str:
+            response = self.llm.chat(
+                messages=messages,
+                decoding_args=self.decoding_args,
+            )
+            self.input_tokens, self.output_tokens = get_request_tokens(
+                response=response["response"], model=self.model
+            )
+            return response["content"]
+
+        return self.retry_policy.call(attempt, description="CodeGenerator.run")
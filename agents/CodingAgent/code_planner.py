@@ -12,6 +12,7 @@ from llms import (
     AnthropicDecodingArguments,
 )
 from llms.base_llm import BaseLLM
+from llms.retry import RetryPolicy
 from tools import ReadCode
 from utils.llm_utils import get_request_tokens
 
@@ -48,6 +49,9 @@ class CodePlanner:
         self.output_tokens = 0
         self.plan = None
         self.max_retries = max_retries
+        self.retry_policy = RetryPolicy.from_config(
+            config, max_attempts=max_retries + 1
+        )
 
         self.read_code_tool = ReadCode(file_path="")
 
@@ -74,25 +78,15 @@ class CodePlanner:
             {"role": "user", "content": f"The problem is: {user_query}"},
         ]
 
-        attempts = 0
-        while True:
-            try:
-                attempts += 1
-                response = self.llm.chat(
-                    messages=messages,
-                    decoding_args=self.decoding_args,
-                )
-                parsed_response = json.loads(response["content"])
-                self.input_tokens, self.output_tokens = get_request_tokens(
-                    response=response, model=self.model
-                )
-                return parsed_response
-            except Exception as e:
-                logger.error(
-                    f"Error in CodePlanning.run: {e}. Retries left = {self.max_retries-attempts}"
-                )
-                if attempts > self.max_retries:
-                    logger.critical(
-                        f"Max retries reached in CodePlanning.run: {e}. Aborting."
-                    )
-                    raise e
+        def attempt() -> Dict:
+            response = self.llm.chat(
+                messages=messages,
+                decoding_args=self.decoding_args,
+            )
+            parsed_response = json.loads(response["content"])
+            self.input_tokens, self.output_tokens = get_request_tokens(
+                response=response["response"], model=self.model
+            )
+            return parsed_response
+
+        return self.retry_policy.call(attempt, description="CodePlanner.run")
@@ -1,5 +1,6 @@
+import asyncio
 import os.path
-from typing import Literal
+from typing import Dict, List, Literal
 
 from agents.base_agent import BaseAgent
 from config import config
@@ -47,7 +48,9 @@ class ContextCollectorAgent(BaseAgent):
         self.tools_dictionary.update({"dependency_manager": DependencyManager})
         self.max_dependency_analysis_depth = max_dependency_analysis_depth
 
-    def run(self, directory: str, user_input: str):
+    def _initial_messages(
+        self, directory: str, user_input: str
+    ) -> List[Dict[str, str]]:
         self.list_files_tool.directory = directory
         files_list = self.list_files_tool.run()
         if files_list["success"]:
@@ -77,52 +80,46 @@ class ContextCollectorAgent(BaseAgent):
 
         logger.debug(f"System Prompt: {system_prompt}")
         logger.debug(f"User Prompt: {user_prompt}")
+        return messages
 
-        relevant_files = []
-        new_files = []
-        root_path_abs = os.path.abspath(directory)
-        for i in range(self.max_dependency_analysis_depth):
-            try:
-                response, parsed_response = self.get_llm_response(
-                    messages=messages, parse_response=True
+    def _dependency_prompt(
+        self, relevant_directories: Dict, root_path_abs: str
+    ) -> str:
+        dependency_prompt = (
+            "Here are the dependencies of the files that you have listed. Go through them and "
+            "list out any files that you think are relevant to the feature request."
+            "If you think that there are no more relevant files, you can respond with an empty dictionary {}.\n"
+            "Remember to follow the same JSON format to respond.\n"
+        )
+        for _, rel_files in relevant_directories.items():
+            for file in rel_files:
+                file_path = file.split(":")[0]
+                tool_response, _ = self.run_tool(
+                    "dependency_manager",
+                    {
+                        "file_path": file_path,
+                        "root_path": root_path_abs,
+                        "only_repo_modules": True,
+                    },
                 )
-                logger.debug(f"[bold red1 on grey3]  Response  [/]:\n{response}")
-                if not parsed_response.get("relevant_directories", None):
-                    break
-
-                relevant_files.append(parsed_response.get("relevant_directories", {}))
-                new_files.append(parsed_response.get("create", {}))
+                tool_response = tool_response.split("\nResponse: ")[-1]
+                dependency_prompt += f"[File] {os.path.relpath(file_path, root_path_abs)}: {tool_response}\n"
+        return dependency_prompt
 
-                dependency_prompt = (
-                    "Here are the dependencies of the files that you have listed. Go through them and "
-                    "list out any files that you think are relevant to the feature request."
-                    "If you think that there are no more relevant files, you can respond with an empty dictionary {}.\n"
-                    "Remember to follow the same JSON format to respond.\n"
-                )
-                for _, rel_files in relevant_files[-1].items():
-                    for file in rel_files:
-                        file_path = file.split(":")[0]
-                        tool_response, _ = self.run_tool(
-                            "dependency_manager",
-                            {
-                                "file_path": file_path,
-                                "root_path": root_path_abs,
-                                "only_repo_modules": True,
-                            },
-                        )
-                        tool_response = tool_response.split("\nResponse: ")[-1]
-                        dependency_prompt += f"[File] {os.path.relpath(file_path, root_path_abs)}: {tool_response}\n"
-                messages.extend(
-                    [
-                        {"role": "assistant", "content": response},
-                        {"role": "user", "content": dependency_prompt},
-                    ]
-                )
-                logger.debug(f"## USER PROMPT : {dependency_prompt}")
-            except Exception as e:
-                logger.critical(f"Error in chat completion: {e}")
-                return {"success": False, "response": str(e)}
+    @staticmethod
+    def _add_turn(
+        messages: List[Dict[str, str]], response: str, dependency_prompt: str
+    ):
+        messages.extend(
+            [
+                {"role": "assistant", "content": response},
+                {"role": "user", "content": dependency_prompt},
+            ]
+        )
+        logger.debug(f"## USER PROMPT : {dependency_prompt}")
 
+    @staticmethod
+    def _result(relevant_files: List[Dict], new_files: List[Dict]) -> Dict:
         # relevant_files is a list of dictionaries
         # these dictionaries might have the same keys
         # their values are lists of file paths
@@ -140,3 +137,57 @@ class ContextCollectorAgent(BaseAgent):
                 "new_files": new_files,
             },
         }
+
+    def run(self, directory: str, user_input: str):
+        messages = self._initial_messages(directory, user_input)
+        relevant_files = []
+        new_files = []
+        root_path_abs = os.path.abspath(directory)
+        for i in range(self.max_dependency_analysis_depth):
+            try:
+                response, parsed_response = self.get_llm_response(
+                    messages=messages, parse_response=True
+                )
+                logger.debug(f"[bold red1 on grey3]  Response  [/]:\n{response}")
+                if not parsed_response.get("relevant_directories", None):
+                    break
+
+                relevant_files.append(parsed_response.get("relevant_directories", {}))
+                new_files.append(parsed_response.get("create", {}))
+                dependency_prompt = self._dependency_prompt(
+                    relevant_files[-1], root_path_abs
+                )
+                self._add_turn(messages, response, dependency_prompt)
+            except Exception as e:
+                logger.critical(f"Error in chat completion: {e}")
+                return {"success": False, "response": str(e)}
+        return self._result(relevant_files, new_files)
+
+    async def arun(self, directory: str, user_input: str):
+        """
+        Coroutine counterpart of `run`, built on `BaseLLM.achat`; the dependency
+        analysis runs in a worker thread.
+        """
+        messages = self._initial_messages(directory, user_input)
+        relevant_files = []
+        new_files = []
+        root_path_abs = os.path.abspath(directory)
+        for i in range(self.max_dependency_analysis_depth):
+            try:
+                response, parsed_response = await self.aget_llm_response(
+                    messages=messages, parse_response=True
+                )
+                logger.debug(f"[bold red1 on grey3]  Response  [/]:\n{response}")
+                if not parsed_response.get("relevant_directories", None):
+                    break
+
+                relevant_files.append(parsed_response.get("relevant_directories", {}))
+                new_files.append(parsed_response.get("create", {}))
+                dependency_prompt = await asyncio.to_thread(
+                    self._dependency_prompt, relevant_files[-1], root_path_abs
+                )
+                self._add_turn(messages, response, dependency_prompt)
+            except Exception as e:
+                logger.critical(f"Error in chat completion: {e}")
+                return {"success": False, "response": str(e)}
+        return self._result(relevant_files, new_files)
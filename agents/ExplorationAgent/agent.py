@@ -1,16 +1,15 @@
-import json
-from typing import Literal
+from typing import Dict, List, Literal, Optional, Tuple
 
 from agents.base_agent import BaseAgent
 from config import config
 
 from utils.doc import Doc
+from utils.state_digest import StateTracker
 from lib import logger
 from tools import ListFiles, ReadCode, ReadCodeSnippet, LSPUtils, Finish
 from agents.ExplorationAgent.tools import UpdateContext
 from tools.utils import generate_tools_subprompt
 from llms import OpenAiChatModels, AnthropicModels
-from agents import MaxIterationsReached
 
 
 class ExplorationAgent(BaseAgent):
@@ -21,6 +20,7 @@ class ExplorationAgent(BaseAgent):
         max_retries: int = 5,
         max_iters: int = 50,
         model_provider: Literal["openai", "anthropic"] = "openai",
+        checkpoint_path: Optional[str] = None,
     ):
         if model_provider == "openai":
             model = OpenAiChatModels.GPT_4O
@@ -36,9 +36,14 @@ class ExplorationAgent(BaseAgent):
             max_retries=max_retries,
             max_iters=max_iters,
             title=title,
+            checkpoint_path=checkpoint_path,
         )
 
         self.root_doc = root_doc
+        self.tool_extra_args = {
+            "root_doc": self.root_doc,
+            "exploration_agent_instance": self,
+        }
 
         self.instructions_prompt = open("agents/prompts/exploration_prompt.txt").read()
         self.list_files_tool = ListFiles(root_doc=root_doc, directory="")
@@ -51,6 +56,7 @@ class ExplorationAgent(BaseAgent):
                 "update_context": UpdateContext,
             }
         )
+        self.context_state = StateTracker("Current Context")
         self.context = {
             "explanation": "",
             "code_flow_graph": "",
@@ -58,8 +64,48 @@ class ExplorationAgent(BaseAgent):
             "similar_feature_dirs": [],
         }
 
-    def run(self, directory: str, user_prompt: str):
+    def get_state(self):
+        return self.context
+
+    def set_state(self, state):
+        self.context = state
+
+    def _start_run(
+        self, directory: str, user_prompt: str, resume: bool
+    ) -> Optional[Tuple[List[Dict[str, str]], int]]:
+        """The messages and step count to run from; None if the run already finished."""
         self.action_graph = []
+        if self.compactor is not None:
+            self.compactor.reset()
+        self.context_state.reset()
+
+        checkpoint = self.restore_checkpoint() if resume else None
+        if checkpoint is None:
+            return self.get_initial_messages(directory, user_prompt), 0
+        if checkpoint["finished"]:
+            return None
+        return checkpoint["messages"], checkpoint["num_iters"]
+
+    def run(self, directory: str, user_prompt: str, resume: bool = False):
+        """
+        With `resume`, continues from the last checkpoint (if there is one) for up
+        to `max_iters` more steps instead of starting over.
+        """
+        start = self._start_run(directory, user_prompt, resume)
+        if start is None:
+            return self.finish_response
+        return self.run_loop(*start, state_tracker=self.context_state)
+
+    async def arun(self, directory: str, user_prompt: str, resume: bool = False):
+        """Coroutine counterpart of `run`, built on `BaseLLM.achat`."""
+        start = self._start_run(directory, user_prompt, resume)
+        if start is None:
+            return self.finish_response
+        return await self.arun_loop(*start, state_tracker=self.context_state)
+
+    def get_initial_messages(
+        self, directory: str, user_prompt: str
+    ) -> List[Dict[str, str]]:
         self.list_files_tool.directory = directory
         files_list = self.list_files_tool.run()
         if files_list["success"]:
@@ -68,7 +114,9 @@ class ExplorationAgent(BaseAgent):
             raise Exception("Failed to list files")
         instructions_prompt = self.instructions_prompt.format(
             INITIAL_REPO_MAP=files_list,
-            AVAILABLE_TOOLS=generate_tools_subprompt(self.tools_dictionary),
+            AVAILABLE_TOOLS=generate_tools_subprompt(
+                self.tools_dictionary, include_schemas=not self.native_tools
+            ),
             USER_REQUEST=user_prompt,
             CONTEXT_UPDATE_TOOL_NAME="update_context",
         )
@@ -82,48 +130,11 @@ class ExplorationAgent(BaseAgent):
                 "role": "system",
                 "content": system_prompt,
             },
-            {"role": "user", "content": instructions_prompt},
+            # the instructions (repo map, tools) never change during a run; flag them
+            # as a stable prefix for the provider's prompt cache
+            {"role": "user", "content": instructions_prompt, "cache": True},
         ]
 
         logger.debug(f"System Prompt: {system_prompt}")
         logger.debug(f"User Prompt: {instructions_prompt}")
-
-        num_iters = 0
-        while num_iters < self.max_iters:
-            messages.append(
-                {
-                    "role": "user",
-                    "content": f"## Current Context: \n {json.dumps(self.context, indent=2)}",
-                }
-            )
-            try:
-                unparsed_response, response = self.get_llm_response(
-                    messages=messages, parse_response=True
-                )
-            except Exception as e:
-                raise e
-
-            logger.debug(
-                f"[bold bright_white on #C738BD]   🧠 Thought   [/]  \n{response['thought']}\n"
-            )
-
-            observation, finish_loop = self.run_tool(
-                tool_name=response.get("tool"),
-                tool_args=response.get("tool_args"),
-                extra_args={
-                    "root_doc": self.root_doc,
-                    "exploration_agent_instance": self,
-                },
-            )
-            if finish_loop:
-                return self.finish_response
-
-            messages.pop()
-            messages.append({"role": "assistant", "content": unparsed_response})
-            messages.append({"role": "user", "content": observation})
-
-            num_iters += 1
-            if num_iters == self.max_iters:
-                raise MaxIterationsReached(num_iters)
-
-        return self.context
+        return messages
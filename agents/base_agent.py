@@ -1,8 +1,12 @@
+import asyncio
 import json
+import time
+import concurrent.futures
 from abc import ABC, abstractmethod
 from config import Config
 from typing import List, Optional, Union, Dict, Literal, Type, Tuple
 
+from agents import MaxIterationsReached
 from lib import logger
 from llms import (
     OpenAiChatModels,
@@ -13,7 +17,14 @@ from llms import (
     AnthropicDecodingArguments,
 )
 from llms.base_llm import BaseLLM
+from llms.retry import RetryPolicy
 from tools import BaseTool, Finish
+from tools.utils import tool_description, tool_parameters
+from utils.checkpoint import AgentCheckpoint
+from utils.context_window import DEFAULT_HEADROOM, ContextWindow
+from utils.conversation_compactor import ConversationCompactor
+from utils.json_stream import IncrementalJSONParser
+from utils.state_digest import StateTracker
 
 
 class BaseAgent(ABC):
@@ -25,6 +36,7 @@ class BaseAgent(ABC):
         title: str,
         max_retries: int = 5,
         max_iters: int = 50,
+        checkpoint_path: Optional[str] = None,
     ):
         self.llm_expected_return_type = return_type
         if isinstance(model, OpenAiChatModels):
@@ -47,8 +59,26 @@ class BaseAgent(ABC):
         self.title = title
         self.config = config
         self.max_retries = max_retries
+        self.retry_policy = RetryPolicy.from_config(config, max_attempts=max_retries)
         self.max_iters = max_iters
 
+        max_input_tokens = config.context_max_input_tokens or int(
+            self.llm.get_token_limit()[0] * DEFAULT_HEADROOM
+        )
+        self.context_window = ContextWindow(
+            model_name=self.llm.model_name,
+            max_input_tokens=max_input_tokens - self.decoding_args.max_tokens,
+            policy=config.context_trim_policy,
+            keep_recent_turns=config.context_keep_recent_turns,
+        )
+        self.compactor: Optional[ConversationCompactor] = None
+        if config.context_compaction:
+            self.compactor = ConversationCompactor(
+                model_name=self.llm.model_name,
+                keep_recent_turns=config.context_keep_recent_turns,
+                batch_size=config.context_compaction_batch,
+            )
+
         self.context_window_tokens = 0
         self.prompt_tokens = 0
         self.completion_tokens = 0
@@ -57,17 +87,99 @@ class BaseAgent(ABC):
         self.finish_response = None
         self.action_graph = []
 
+        # With streaming on, json responses are parsed as they arrive and, when
+        # `tool_extra_args` is set, read-only tools start as soon as their call is
+        # complete
+        self.stream = config.llm_stream
+        self.tool_extra_args: Optional[Dict] = None
+        self.stream_metrics: List[Dict[str, Optional[float]]] = []
+        self.max_tool_calls = config.max_tool_calls_per_turn
+        # With native tool calling, tools are sent as provider tool definitions and
+        # the calls come back already structured (see `BaseLLM.tool_calls_content`)
+        self.native_tools = config.llm_native_tools and return_type == "json_object"
+        if self.native_tools and isinstance(
+            self.decoding_args, OpenAIDecodingArguments
+        ):
+            self.decoding_args.response_format = {"type": "text"}
+        self._native_tool_kwargs: Optional[Tuple[Tuple, Dict]] = None
+        self.tool_workers = config.tool_workers
+        self._dispatched_tools: List[Tuple[str, Dict, concurrent.futures.Future]] = []
+        self._tool_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        # With a checkpoint path, the run is saved after every step and can be
+        # resumed from there (see `save_checkpoint` and `restore_checkpoint`)
+        self.checkpoint: Optional[AgentCheckpoint] = (
+            AgentCheckpoint(checkpoint_path) if checkpoint_path else None
+        )
+
     @abstractmethod
     def run(self, *args, **kwargs): ...
 
     def get_model(self) -> str:
         return str(self.model)
 
+    def get_state(self):
+        """The working state of the agent (its context, plan, ...) to checkpoint."""
+        return None
+
+    def set_state(self, state):
+        pass
+
+    def save_checkpoint(
+        self, messages: List[Dict[str, str]], num_iters: int, finished: bool = False
+    ):
+        """Saves the run after `num_iters` completed steps, if checkpointing is on."""
+        if self.checkpoint is None:
+            return
+        self.checkpoint.save(
+            {
+                "title": self.title,
+                "model": self.get_model(),
+                "num_iters": num_iters,
+                "finished": finished,
+                "messages": messages,
+                "state": self.get_state(),
+                "finish_response": self.finish_response,
+                "action_graph": self.action_graph,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "context_window_tokens": self.context_window_tokens,
+            }
+        )
+
+    def restore_checkpoint(self) -> Optional[Dict]:
+        """
+        Restores the state, token counters, action graph and finish response of
+        the last checkpoint and returns it, so the run can continue from its
+        `messages` and `num_iters`. None when there is no checkpoint.
+        """
+        checkpoint = self.checkpoint.load() if self.checkpoint is not None else None
+        if checkpoint is None:
+            return None
+        if checkpoint["model"] != self.get_model():
+            logger.warning(
+                f"{self.title}: resuming a run of {checkpoint['model']} with "
+                f"{self.get_model()}"
+            )
+        self.set_state(checkpoint["state"])
+        self.finish_response = checkpoint["finish_response"]
+        self.action_graph = checkpoint["action_graph"]
+        self.prompt_tokens = checkpoint["prompt_tokens"]
+        self.completion_tokens = checkpoint["completion_tokens"]
+        self.context_window_tokens = checkpoint["context_window_tokens"]
+        logger.info(
+            f"{self.title}: resuming from {self.checkpoint.path} after "
+            f"{checkpoint['num_iters']} steps"
+        )
+        return checkpoint
+
     @staticmethod
     def _get_request_tokens(
         response,
         model: Union[OpenAiChatModels, AnthropicModels],
     ):
+        if response is None:
+            # replayed from the response cache, or a failed call
+            return 0, 0
         if isinstance(model, OpenAiChatModels):
             return response.usage.prompt_tokens, response.usage.completion_tokens
         elif isinstance(model, AnthropicModels):
@@ -75,58 +187,213 @@ class BaseAgent(ABC):
         else:
             raise ValueError("Invalid model provider")
 
+    def _handle_llm_response(
+        self, response: dict, parse_response: bool
+    ) -> Tuple[str, Optional[Dict]]:
+        parsed_response_object: Optional[Dict] = None
+        prompt_tokens, completion_tokens = 0, 0
+        try:
+            prompt_tokens, completion_tokens = self._get_request_tokens(
+                response["response"], self.model
+            )
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        except ValueError as vae:
+            pass
+        if self.llm_expected_return_type == "json_object" and parse_response:
+            parsed_response_object = json.loads(response["content"])
+
+        self.context_window_tokens += prompt_tokens + completion_tokens
+        return response["content"], parsed_response_object
+
+    def get_native_tool_kwargs(self) -> Dict:
+        """Provider tool definitions for `tools_dictionary`, rebuilt only when it changes."""
+        tools = tuple(self.tools_dictionary.items())
+        if self._native_tool_kwargs is None or self._native_tool_kwargs[0] != tools:
+            definitions = [
+                (name, tool_description(tool), tool_parameters(tool))
+                for name, tool in tools
+            ]
+            self._native_tool_kwargs = (
+                tools,
+                self.llm.native_tool_kwargs(definitions),
+            )
+        return self._native_tool_kwargs[1]
+
+    def _fit_context(self, messages: List[Dict[str, str]]):
+        """
+        Compacts old observations of `messages` in place and trims old turns when
+        the prompt would still not fit.
+        """
+        if self.compactor is not None and (turns := self.compactor.compact(messages)):
+            logger.debug(f"{self.title}: compacted {turns} old observations")
+        result = self.context_window.fit(messages)
+        if result.trimmed:
+            logger.info(
+                f"{self.title}: trimmed context from {result.tokens_before} to "
+                f"{result.tokens_after} tokens ({result.truncated_messages} observations "
+                f"truncated, {result.dropped_turns} turns dropped)"
+            )
+        if result.tokens_after > self.context_window.max_input_tokens:
+            logger.warning(
+                f"{self.title}: prompt of {result.tokens_after} tokens is over the "
+                f"{self.context_window.max_input_tokens} token budget even after trimming"
+            )
+
+    def log_compaction_stats(self):
+        """Reports what conversation compaction saved over the current run."""
+        if self.compactor is None or not self.compactor.stats.turns_compacted:
+            return
+        stats = self.compactor.stats
+        logger.info(
+            f"{self.title}: compacted {stats.turns_compacted} observations from "
+            f"{stats.observation_tokens_before} to {stats.observation_tokens_after} "
+            f"tokens (ratio {stats.ratio:.1%}), saving {stats.prompt_tokens_saved} "
+            f"prompt tokens over the run"
+        )
+
     def get_llm_response(
         self, messages: List[Dict[str, str]], parse_response: bool = True, **kwargs
     ) -> Tuple[str, Optional[Dict]]:
-        num_tries = 0
-        parsed_response_object: Optional[Dict] = None
-        while num_tries < self.max_retries:
-            try:
-                response = self.llm.chat(
-                    messages=messages, decoding_args=self.decoding_args, **kwargs
-                )
-                prompt_tokens, completion_tokens = 0, 0
-                try:
-                    prompt_tokens, completion_tokens = self._get_request_tokens(
-                        response["response"], self.model
-                    )
-                    self.prompt_tokens += prompt_tokens
-                    self.completion_tokens += completion_tokens
-                except ValueError as vae:
-                    pass
-                if self.llm_expected_return_type == "json_object" and parse_response:
-                    parsed_response_object = json.loads(response["content"])
-
-                self.context_window_tokens += prompt_tokens + completion_tokens
-                return response["content"], parsed_response_object
-            except json.JSONDecodeError as jde:
-                logger.error(f"Error parsing LLM Response: {jde}")
-                num_tries += 1
-                if num_tries == self.max_retries:
-                    raise jde
-            except Exception as e:
-                logger.error(f"Error generating LLM Response: {e}")
-                num_tries += 1
-                if num_tries == self.max_retries:
-                    logger.critical(f"Max retries reached: {e}.\nMessage: {messages}")
-                    raise e
+        self._fit_context(messages)
+        if self.native_tools and parse_response:
+            kwargs = {**self.get_native_tool_kwargs(), **kwargs}
 
-    def run_tool(
+        def attempt() -> Tuple[str, Optional[Dict]]:
+            if self._should_stream(parse_response):
+                return self._get_streamed_llm_response(messages, **kwargs)
+            response = self.llm.chat(
+                messages=messages, decoding_args=self.decoding_args, **kwargs
+            )
+            return self._handle_llm_response(response, parse_response)
+
+        return self.retry_policy.call(attempt, description=f"{self.title} LLM call")
+
+    def _should_stream(self, parse_response: bool) -> bool:
+        return (
+            self.stream
+            and not self.native_tools
+            and self.llm_expected_return_type == "json_object"
+            and parse_response
+        )
+
+    def _get_streamed_llm_response(
+        self, messages: List[Dict[str, str]], **kwargs
+    ) -> Tuple[str, Optional[Dict]]:
+        """
+        Streams a json response and parses it incrementally. Once `tool` and
+        `tool_args` (or a `tool_calls` batch) are complete, read-only tools are
+        dispatched (see `_dispatch_tool`) while the rest of the response is still
+        streaming. Time to first token and time to tool dispatch are recorded in
+        `stream_metrics`.
+        """
+        parser = IncrementalJSONParser()
+        metrics = {"time_to_first_token": None, "time_to_tool_dispatch": None}
+        self._dispatched_tools = []
+        start = time.perf_counter()
+
+        def on_chunk(chunk: str):
+            if metrics["time_to_first_token"] is None:
+                metrics["time_to_first_token"] = time.perf_counter() - start
+            parser.feed(chunk)
+            if metrics["time_to_tool_dispatch"] is not None:
+                return
+            if parser.has("tool") and parser.has("tool_args"):
+                metrics["time_to_tool_dispatch"] = time.perf_counter() - start
+                self._dispatch_tool(parser.fields["tool"], parser.fields["tool_args"])
+            elif parser.has("tool_calls"):
+                metrics["time_to_tool_dispatch"] = time.perf_counter() - start
+                for tool_name, tool_args in self.get_tool_calls(parser.fields):
+                    self._dispatch_tool(tool_name, tool_args)
+
+        response = self.llm.stream_chat(
+            messages=messages,
+            decoding_args=self.decoding_args,
+            on_chunk=on_chunk,
+            **kwargs,
+        )
+        metrics["total_time"] = time.perf_counter() - start
+        self.stream_metrics.append(metrics)
+        logger.debug(f"Stream metrics: {metrics}")
+        try:
+            return self._handle_llm_response(response, parse_response=True)
+        except json.JSONDecodeError:
+            if not (parser.has("tool") and parser.has("tool_args")) and not (
+                parser.has("tool_calls")
+            ):
+                raise
+            # the tool call itself was well formed; only what followed it was not
+            return response["content"], dict(parser.fields)
+
+    def _dispatch_tool(self, tool_name: Optional[str], tool_args: Dict):
+        # only read-only tools start before the response is validated; a tool with
+        # side effects would run again if the call is retried
+        if (
+            self.tool_extra_args is None
+            or not self._is_read_only(tool_name)
+            or not isinstance(tool_args, dict)
+        ):
+            return
+        future = self._submit_tool(tool_name, tool_args, self.tool_extra_args)
+        self._dispatched_tools.append((tool_name, tool_args, future))
+
+    def _submit_tool(
+        self, tool_name: Optional[str], tool_args: Dict, extra_args: Optional[Dict]
+    ) -> concurrent.futures.Future:
+        if self._tool_executor is None:
+            self._tool_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.tool_workers
+            )
+        return self._tool_executor.submit(
+            self._execute_tool, tool_name, tool_args, extra_args
+        )
+
+    def _take_dispatched(
+        self, tool_name: Optional[str], tool_args: Dict
+    ) -> Optional[concurrent.futures.Future]:
+        """The future of a matching call already started while streaming, if any."""
+        for index, (name, args, future) in enumerate(self._dispatched_tools):
+            if name == tool_name and args == tool_args:
+                del self._dispatched_tools[index]
+                return future
+        return None
+
+    def _is_read_only(self, tool_name: Optional[str]) -> bool:
+        tool_class = self.tools_dictionary.get(tool_name)
+        return tool_class is not None and tool_class.read_only
+
+    async def aget_llm_response(
+        self, messages: List[Dict[str, str]], parse_response: bool = True, **kwargs
+    ) -> Tuple[str, Optional[Dict]]:
+        """
+        Coroutine counterpart of `get_llm_response`, built on `BaseLLM.achat`.
+        Streaming is only implemented on the blocking clients, so streamed
+        responses are read in a worker thread instead.
+        """
+        if self._should_stream(parse_response):
+            return await asyncio.to_thread(
+                self.get_llm_response, messages, parse_response, **kwargs
+            )
+        self._fit_context(messages)
+        if self.native_tools and parse_response:
+            kwargs = {**self.get_native_tool_kwargs(), **kwargs}
+
+        async def attempt() -> Tuple[str, Optional[Dict]]:
+            response = await self.llm.achat(
+                messages=messages, decoding_args=self.decoding_args, **kwargs
+            )
+            return self._handle_llm_response(response, parse_response)
+
+        return await self.retry_policy.acall(
+            attempt, description=f"{self.title} LLM call"
+        )
+
+    def _execute_tool(
         self,
         tool_name: Optional[str],
         tool_args: Dict,
         extra_args: Optional[Dict] = None,
-    ) -> Tuple[str, bool]:
-        """
-        Run the tool with the given name and arguments.
-        Returns the observation and a boolean indicating if the tool is a finish tool.
-        """
-        self.action_graph.append(
-            {
-                "action": tool_name,
-                "args": tool_args,
-            }
-        )
+    ) -> str:
         tool_class = self.tools_dictionary.get(tool_name)
         if tool_class is None:
             if tool_name:
@@ -148,13 +415,222 @@ class BaseAgent(ABC):
                 logger.error(
                     f"Error running tool {tool_name} with args {tool_args}: {e}"
                 )
+        return observation
+
+    def get_tool_calls(self, response: Dict) -> List[Tuple[Optional[str], Dict]]:
+        """
+        The (tool name, tool args) calls of a parsed response: its `tool_calls`
+        batch, or the single `tool` and `tool_args`. Batches are capped at
+        `config.max_tool_calls_per_turn`.
+        """
+        tool_calls = response.get("tool_calls")
+        if not isinstance(tool_calls, list) or not tool_calls:
+            return [(response.get("tool"), response.get("tool_args") or {})]
+        if len(tool_calls) > self.max_tool_calls:
+            logger.warning(
+                f"{len(tool_calls)} tool calls in one turn; only the first "
+                f"{self.max_tool_calls} are run"
+            )
+        return [
+            (call.get("tool"), call.get("tool_args") or {})
+            if isinstance(call, dict)
+            else (None, {})
+            for call in tool_calls[: self.max_tool_calls]
+        ]
 
+    @staticmethod
+    def _log_tool(tool_name: Optional[str], tool_args: Dict, observation: str):
         logger.debug(f"[bold bright_white on blue_violet]  🛠️ Tool   [/]")
         logger.debug(f"{tool_name}")
         for arg, value in tool_args.items():
             logger.debug(f"  - {arg}: {value}")
         logger.debug(f"[bold bright_white on dark_green]  🔍 Observation   [/]")
         logger.debug(f"{observation}")
+
+    def run_tool(
+        self,
+        tool_name: Optional[str],
+        tool_args: Dict,
+        extra_args: Optional[Dict] = None,
+    ) -> Tuple[str, bool]:
+        """
+        Run the tool with the given name and arguments.
+        Returns the observation and a boolean indicating if the tool is a finish tool.
+        """
+        self.action_graph.append(
+            {
+                "action": tool_name,
+                "args": tool_args,
+            }
+        )
+        future = self._take_dispatched(tool_name, tool_args)
+        self._dispatched_tools = []
+        if future is not None:
+            # already started while the response was streaming
+            observation = future.result()
+        else:
+            observation = self._execute_tool(tool_name, tool_args, extra_args)
+
+        self._log_tool(tool_name, tool_args, observation)
         if tool_name == "finish":
             self.finish_response = tool_args
         return observation, tool_name == "finish"
+
+    def run_tools(
+        self,
+        tool_calls: List[Tuple[Optional[str], Dict]],
+        extra_args: Optional[Dict] = None,
+    ) -> Tuple[str, bool]:
+        """
+        Runs the tool calls of one turn and returns their observations as one
+        message, numbered in call order, and whether `finish` was called.
+        Consecutive read-only tools run concurrently on the tool worker pool; any
+        other tool waits for the calls before it and runs on its own. Calls after
+        `finish` are not run.
+        """
+        if len(tool_calls) == 1:
+            return self.run_tool(*tool_calls[0], extra_args=extra_args)
+
+        results: List[Union[str, concurrent.futures.Future]] = []
+        finished = False
+        for tool_name, tool_args in tool_calls:
+            self.action_graph.append({"action": tool_name, "args": tool_args})
+            if tool_name == "finish":
+                self.finish_response = tool_args
+                finished = True
+                break
+            if self._is_read_only(tool_name):
+                future = self._take_dispatched(tool_name, tool_args)
+                results.append(
+                    future or self._submit_tool(tool_name, tool_args, extra_args)
+                )
+            else:
+                concurrent.futures.wait(
+                    [r for r in results if isinstance(r, concurrent.futures.Future)]
+                )
+                results.append(self._execute_tool(tool_name, tool_args, extra_args))
+        self._dispatched_tools = []
+
+        observations = []
+        for index, (result, (tool_name, tool_args)) in enumerate(
+            zip(results, tool_calls), start=1
+        ):
+            observation = (
+                result.result()
+                if isinstance(result, concurrent.futures.Future)
+                else result
+            )
+            self._log_tool(tool_name, tool_args, observation)
+            observations.append(
+                f"## Observation {index}/{len(tool_calls)}: {tool_name}\n"
+                + observation.removeprefix("## Observation\n")
+            )
+        return "\n\n".join(observations), finished
+
+    def _begin_step(
+        self, messages: List[Dict[str, str]], state_tracker: Optional[StateTracker]
+    ):
+        # the state is resent only when it changed, as a delta when that is smaller
+        if state_tracker is not None and (
+            state_message := state_tracker.message(self.get_state(), messages)
+        ):
+            messages.append(state_message)
+
+    def _end_step(
+        self,
+        messages: List[Dict[str, str]],
+        unparsed_response: str,
+        observation: str,
+        finish_loop: bool,
+        num_iters: int,
+        max_iters: int,
+    ) -> int:
+        """Checkpoints a completed step and returns the new number of steps."""
+        if finish_loop:
+            self.save_checkpoint(messages, num_iters, finished=True)
+            self.log_compaction_stats()
+            return num_iters
+
+        messages.append({"role": "assistant", "content": unparsed_response})
+        # everything up to the latest observation is resent unchanged next turn
+        messages.append({"role": "user", "content": observation, "cache": True})
+
+        num_iters += 1
+        self.save_checkpoint(messages, num_iters)
+        if num_iters == max_iters:
+            self.log_compaction_stats()
+            raise MaxIterationsReached(num_iters)
+        return num_iters
+
+    def run_loop(
+        self,
+        messages: List[Dict[str, str]],
+        num_iters: int = 0,
+        state_tracker: Optional[StateTracker] = None,
+    ):
+        """
+        Asks the model for tool calls and runs them, checkpointing every step,
+        until `finish` is called (its arguments are returned) or `max_iters` more
+        steps have run.
+        """
+        max_iters = num_iters + self.max_iters
+        while num_iters < max_iters:
+            self._begin_step(messages, state_tracker)
+            unparsed_response, response = self.get_llm_response(
+                messages=messages, parse_response=True
+            )
+            logger.debug(
+                f"[bold bright_white on #C738BD]   🧠 Thought   [/]  \n{response.get('thought')}\n"
+            )
+            observation, finish_loop = self.run_tools(
+                tool_calls=self.get_tool_calls(response),
+                extra_args=self.tool_extra_args,
+            )
+            num_iters = self._end_step(
+                messages,
+                unparsed_response,
+                observation,
+                finish_loop,
+                num_iters,
+                max_iters,
+            )
+            if finish_loop:
+                break
+        return self.finish_response
+
+    async def arun_loop(
+        self,
+        messages: List[Dict[str, str]],
+        num_iters: int = 0,
+        state_tracker: Optional[StateTracker] = None,
+    ):
+        """
+        Coroutine counterpart of `run_loop`. The model is called with
+        `aget_llm_response` and the (blocking) tools run in a worker thread, so
+        many agents can share one event loop.
+        """
+        max_iters = num_iters + self.max_iters
+        while num_iters < max_iters:
+            self._begin_step(messages, state_tracker)
+            unparsed_response, response = await self.aget_llm_response(
+                messages=messages, parse_response=True
+            )
+            logger.debug(
+                f"[bold bright_white on #C738BD]   🧠 Thought   [/]  \n{response.get('thought')}\n"
+            )
+            observation, finish_loop = await asyncio.to_thread(
+                self.run_tools,
+                tool_calls=self.get_tool_calls(response),
+                extra_args=self.tool_extra_args,
+            )
+            num_iters = self._end_step(
+                messages,
+                unparsed_response,
+                observation,
+                finish_loop,
+                num_iters,
+                max_iters,
+            )
+            if finish_loop:
+                break
+        return self.finish_response
@@ -1,4 +1,5 @@
 import os
+import json
 from dotenv import load_dotenv
 import logging
 from rich.console import Console
@@ -24,6 +25,32 @@ class Config:
                 NOTSET = 0
         - openai_api_key (str): API key for OpenAI.
         - anthropic_api_key (str): API key for Anthropic.
+        - lsp_idle_timeout (float): Seconds a warm language server may stay idle before it is shut down.
+        - lazy_doc_index (bool): Load the documentation index lazily from its store instead of all at once.
+        - doc_model (str): Model used to document the repository (e.g. "gpt-4o"); empty disables generation.
+        - doc_max_concurrency (int): Maximum number of documentation requests in flight at once.
+        - llm_max_connections (int): Size of the shared HTTP connection pool per LLM provider and key.
+        - llm_max_keepalive_connections (int): Idle connections kept open in that pool.
+        - llm_timeout (float): Read/write timeout of LLM requests, in seconds.
+        - llm_connect_timeout (float): Connect timeout of LLM requests, in seconds.
+        - llm_cache (bool): Cache temperature-0 LLM responses and replay them for identical requests.
+        - llm_cache_dir (str): Directory of the on-disk response cache.
+        - llm_cache_max_memory_entries (int): Responses kept in the in-memory LRU.
+        - llm_cache_max_disk_mb (float): Size of the on-disk response cache before old entries are evicted.
+        - llm_stream (bool): Stream agent responses and start read-only tools as soon as their call is complete.
+        - llm_rate_limits (dict): Per "provider" or "provider/model" {"rpm": ..., "tpm": ...} budgets, as JSON; unlimited when empty (e.g. {"openai": {"rpm": 500, "tpm": 30000}}); either limit may be left out.
+        - pipeline_workers (int): Feature requests run at once by `run_cc_exp_pl_parallel`.
+        - llm_retry_base_delay (float): First backoff step between retried LLM calls, in seconds.
+        - llm_retry_max_delay (float): Longest wait between retried LLM calls, in seconds; a longer Retry-After gives up instead.
+        - llm_retry_deadline (float): Seconds after which a failing LLM call is no longer retried; 0 disables it.
+        - context_trim_policy (str): How agents keep old turns within the context window: "truncate", "drop" or "none".
+        - context_max_input_tokens (int): Prompt budget of agent calls; 0 uses the model's input limit.
+        - context_keep_recent_turns (int): Most recent tool calls and observations that are never trimmed.
+        - context_compaction (bool): Replace old agent observations with short digests (path, lines, symbols).
+        - context_compaction_batch (int): Old turns compacted together, so the prompt prefix changes less often.
+        - max_tool_calls_per_turn (int): Most tool calls an agent runs from one `tool_calls` batch.
+        - tool_workers (int): Threads running an agent's read-only tool calls concurrently.
+        - llm_native_tools (bool): Register agent tools with the provider's native tool calling instead of describing them in the prompt.
     """
 
     console: Console = field(init=False)
@@ -31,6 +58,32 @@ class Config:
     log_level: int = field(init=False)
     openai_api_key: str = field(init=False)
     anthropic_api_key: str = field(init=False)
+    lsp_idle_timeout: float = field(default=300.0)
+    lazy_doc_index: bool = field(default=False)
+    doc_model: str = field(default="")
+    doc_max_concurrency: int = field(default=4)
+    llm_max_connections: int = field(default=100)
+    llm_max_keepalive_connections: int = field(default=20)
+    llm_timeout: float = field(default=600.0)
+    llm_connect_timeout: float = field(default=10.0)
+    llm_cache: bool = field(default=False)
+    llm_cache_dir: str = field(default="saved_states/llm_cache")
+    llm_cache_max_memory_entries: int = field(default=512)
+    llm_cache_max_disk_mb: float = field(default=256.0)
+    llm_stream: bool = field(default=False)
+    llm_rate_limits: dict = field(default_factory=dict)
+    pipeline_workers: int = field(default=4)
+    llm_retry_base_delay: float = field(default=1.0)
+    llm_retry_max_delay: float = field(default=60.0)
+    llm_retry_deadline: float = field(default=300.0)
+    context_trim_policy: str = field(default="truncate")
+    context_max_input_tokens: int = field(default=0)
+    context_keep_recent_turns: int = field(default=3)
+    context_compaction: bool = field(default=True)
+    context_compaction_batch: int = field(default=4)
+    max_tool_calls_per_turn: int = field(default=8)
+    tool_workers: int = field(default=4)
+    llm_native_tools: bool = field(default=False)
 
     def __post_init__(self):
         self.console = Console()
@@ -41,3 +94,80 @@ class Config:
         self.log_level = getattr(logging, self.log_level_str.upper())
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.anthropic_api_key = os.getenv("ANTHROPIC_API_KEY")
+        self.lsp_idle_timeout = float(
+            os.getenv("LSP_IDLE_TIMEOUT", self.lsp_idle_timeout)
+        )
+        self.lazy_doc_index = os.getenv(
+            "LAZY_DOC_INDEX", str(self.lazy_doc_index)
+        ).lower() in ("1", "true", "yes")
+        self.doc_model = os.getenv("DOC_MODEL", self.doc_model)
+        self.doc_max_concurrency = int(
+            os.getenv("DOC_MAX_CONCURRENCY", self.doc_max_concurrency)
+        )
+        self.llm_max_connections = int(
+            os.getenv("LLM_MAX_CONNECTIONS", self.llm_max_connections)
+        )
+        self.llm_max_keepalive_connections = int(
+            os.getenv(
+                "LLM_MAX_KEEPALIVE_CONNECTIONS", self.llm_max_keepalive_connections
+            )
+        )
+        self.llm_timeout = float(os.getenv("LLM_TIMEOUT", self.llm_timeout))
+        self.llm_connect_timeout = float(
+            os.getenv("LLM_CONNECT_TIMEOUT", self.llm_connect_timeout)
+        )
+        self.llm_cache = os.getenv("LLM_CACHE", str(self.llm_cache)).lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        self.llm_cache_dir = os.getenv("LLM_CACHE_DIR", self.llm_cache_dir)
+        self.llm_cache_max_memory_entries = int(
+            os.getenv(
+                "LLM_CACHE_MAX_MEMORY_ENTRIES", self.llm_cache_max_memory_entries
+            )
+        )
+        self.llm_cache_max_disk_mb = float(
+            os.getenv("LLM_CACHE_MAX_DISK_MB", self.llm_cache_max_disk_mb)
+        )
+        self.llm_stream = os.getenv("LLM_STREAM", str(self.llm_stream)).lower() in (
+            "1",
+            "true",
+            "yes",
+        )
+        if os.getenv("LLM_RATE_LIMITS"):
+            self.llm_rate_limits = json.loads(os.getenv("LLM_RATE_LIMITS"))
+        self.pipeline_workers = int(
+            os.getenv("PIPELINE_WORKERS", self.pipeline_workers)
+        )
+        self.llm_retry_base_delay = float(
+            os.getenv("LLM_RETRY_BASE_DELAY", self.llm_retry_base_delay)
+        )
+        self.llm_retry_max_delay = float(
+            os.getenv("LLM_RETRY_MAX_DELAY", self.llm_retry_max_delay)
+        )
+        self.llm_retry_deadline = float(
+            os.getenv("LLM_RETRY_DEADLINE", self.llm_retry_deadline)
+        )
+        self.context_trim_policy = os.getenv(
+            "CONTEXT_TRIM_POLICY", self.context_trim_policy
+        ).lower()
+        self.context_max_input_tokens = int(
+            os.getenv("CONTEXT_MAX_INPUT_TOKENS", self.context_max_input_tokens)
+        )
+        self.context_keep_recent_turns = int(
+            os.getenv("CONTEXT_KEEP_RECENT_TURNS", self.context_keep_recent_turns)
+        )
+        self.context_compaction = os.getenv(
+            "CONTEXT_COMPACTION", str(self.context_compaction)
+        ).lower() in ("1", "true", "yes")
+        self.context_compaction_batch = int(
+            os.getenv("CONTEXT_COMPACTION_BATCH", self.context_compaction_batch)
+        )
+        self.max_tool_calls_per_turn = int(
+            os.getenv("MAX_TOOL_CALLS_PER_TURN", self.max_tool_calls_per_turn)
+        )
+        self.tool_workers = int(os.getenv("TOOL_WORKERS", self.tool_workers))
+        self.llm_native_tools = os.getenv(
+            "LLM_NATIVE_TOOLS", str(self.llm_native_tools)
+        ).lower() in ("1", "true", "yes")
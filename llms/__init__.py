@@ -6,3 +6,4 @@ from .base_types import (
     AnthropicDecodingArguments,
     AnthropicModels,
 )
+from .stub_llm import StubLLM
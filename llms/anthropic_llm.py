@@ -1,25 +1,36 @@
 import copy
-from typing import List, Dict, Union
+from typing import Callable, List, Dict, Optional, Tuple, Union
 import anthropic
 
 from config import Config, console
-from lib import logger
 from llms.base_llm import BaseLLM
+from llms.client_registry import client_registry
 from llms.base_types import AnthropicDecodingArguments, AnthropicModels
 
+# Prompt cache breakpoints the Messages API accepts per request
+MAX_CACHE_BREAKPOINTS = 4
+
 
 class AnthropicLLM(BaseLLM):
+    provider = "anthropic"
+
     def __init__(self, model: Union[str, AnthropicModels], config: Config, title: str):
         super().__init__(model, config, title)
         self.model_name = model.value if isinstance(model, AnthropicModels) else model
-        self.client = anthropic.Anthropic(api_key=config.anthropic_api_key)
+        self.client = client_registry.get_client(
+            "anthropic", config.anthropic_api_key
+        )
 
-    def chat(
+    def _get_async_client(self) -> anthropic.AsyncAnthropic:
+        return client_registry.get_async_client(
+            "anthropic", self.config.anthropic_api_key
+        )
+
+    def _prepare_request(
         self,
         messages: List[Dict[str, str]],
-        decoding_args: AnthropicDecodingArguments = None,
-        **kwargs,
-    ) -> dict:
+        decoding_args: Optional[AnthropicDecodingArguments],
+    ) -> Tuple[List[Dict], AnthropicDecodingArguments]:
         # Copying the message list to avoid modifying the original list
         # Since Claude requires the system prompt to be mentioned
         # in the decoding args, we need to modify the messages list
@@ -28,37 +39,135 @@ class AnthropicLLM(BaseLLM):
         # with the openai chat method
         messages = copy.deepcopy(messages)
         messages = self.merge_user_messages(messages)
-        decoding_args = decoding_args or AnthropicDecodingArguments()
-        try:
-            if messages[0]["role"] == "system":
-                decoding_args.system = messages[0]["content"]
-                # Remove the system message from the messages list
-                messages = messages[1:]
-            response = self.client.messages.create(
-                model=self.model_name,
-                messages=messages,
-                **decoding_args.__dict__,
-                **kwargs,
-            )
-            self.log_tokens(
-                input_tokens=response.usage.input_tokens,
-                output_tokens=response.usage.output_tokens,
-                title=self.title,
-            )
-            return {"response": response, "content": response.content[0].text}
-        except Exception as e:
-            logger.error(f"Error in chat completion: {e}")
-            return {"response": None, "content": str(e)}
+        # the caller's decoding args are shared between calls; never write to them
+        decoding_args = copy.copy(decoding_args or AnthropicDecodingArguments())
+        if messages[0]["role"] == "system":
+            decoding_args.system = messages[0]["content"]
+            # Remove the system message from the messages list
+            messages = messages[1:]
+        return messages, decoding_args
+
+    def get_usage_tokens(self, response) -> Optional[int]:
+        usage = response.usage
+        cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        return usage.input_tokens + cache_write_tokens + usage.output_tokens
+
+    def _completion_result(self, response) -> dict:
+        usage = response.usage
+        # input_tokens only counts the uncached part of the prompt
+        cache_read_tokens = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write_tokens = getattr(usage, "cache_creation_input_tokens", None) or 0
+        self.log_tokens(
+            input_tokens=usage.input_tokens + cache_read_tokens + cache_write_tokens,
+            output_tokens=usage.output_tokens,
+            title=self.title,
+            cache_read_tokens=cache_read_tokens,
+            cache_write_tokens=cache_write_tokens,
+        )
+        text = "".join(
+            block.text for block in response.content if block.type == "text"
+        )
+        calls = [
+            (block.name, block.input)
+            for block in response.content
+            if block.type == "tool_use"
+        ]
+        if calls:
+            text = self.tool_calls_content(text, calls)
+        return {"response": response, "content": text}
+
+    def native_tool_kwargs(self, tools: List[Tuple[str, str, Dict]]) -> Dict:
+        return {
+            "tools": [
+                {"name": name, "description": description, "input_schema": parameters}
+                for name, description, parameters in tools
+            ],
+            "tool_choice": {"type": "any"},
+        }
+
+    def _chat(
+        self,
+        messages: List[Dict[str, str]],
+        decoding_args: AnthropicDecodingArguments = None,
+        **kwargs,
+    ) -> dict:
+        messages, decoding_args = self._prepare_request(messages, decoding_args)
+        response = self.client.messages.create(
+            model=self.model_name,
+            messages=messages,
+            **decoding_args.__dict__,
+            **kwargs,
+        )
+        return self._completion_result(response)
+
+    async def _achat(
+        self,
+        messages: List[Dict[str, str]],
+        decoding_args: AnthropicDecodingArguments = None,
+        **kwargs,
+    ) -> dict:
+        messages, decoding_args = self._prepare_request(messages, decoding_args)
+        response = await self._get_async_client().messages.create(
+            model=self.model_name,
+            messages=messages,
+            **decoding_args.__dict__,
+            **kwargs,
+        )
+        return self._completion_result(response)
+
+    def _stream_chat(
+        self,
+        messages: List[Dict[str, str]],
+        decoding_args: AnthropicDecodingArguments,
+        on_chunk: Callable[[str], None],
+        **kwargs,
+    ) -> dict:
+        messages, decoding_args = self._prepare_request(messages, decoding_args)
+        params = {
+            key: value
+            for key, value in decoding_args.__dict__.items()
+            if key != "stream"
+        }
+        with self.client.messages.stream(
+            model=self.model_name, messages=messages, **params, **kwargs
+        ) as stream:
+            for text in stream.text_stream:
+                on_chunk(text)
+            response = stream.get_final_message()
+        return self._completion_result(response)
+
+    @staticmethod
+    def _content_blocks(message: Dict, cache: bool) -> List[Dict]:
+        content = message["content"]
+        if isinstance(content, str):
+            # the API rejects empty text blocks
+            blocks = [{"type": "text", "text": content}] if content else []
+        else:
+            blocks = list(content)
+        if cache and blocks:
+            blocks[-1] = {**blocks[-1], "cache_control": {"type": "ephemeral"}}
+        return blocks
 
     @staticmethod
-    def merge_user_messages(messages: List[Dict[str, str]]):
-        # if there are 2 consecutive user messages, merge them
+    def merge_user_messages(messages: List[Dict]) -> List[Dict]:
+        """
+        Converts messages to content block lists and merges consecutive user
+        messages into one turn, keeping each message as its own block. Messages
+        flagged with `"cache": True` end a stable prefix and get a prompt cache
+        breakpoint; the API allows MAX_CACHE_BREAKPOINTS, so only the first
+        flagged message (the long instructions) and the latest ones are kept.
+        """
+        flagged = [i for i, message in enumerate(messages) if message.get("cache")]
+        breakpoints = set(flagged[:1] + flagged[1:][-(MAX_CACHE_BREAKPOINTS - 1) :])
         merged_messages = []
         for i, message in enumerate(messages):
-            if message["role"] in ["assistant", "system"] or messages[i - 1][
-                "role"
-            ] in ["assistant", "system"]:
-                merged_messages.append(message)
+            blocks = AnthropicLLM._content_blocks(message, cache=i in breakpoints)
+            if (
+                merged_messages
+                and message["role"] == "user"
+                and merged_messages[-1]["role"] == "user"
+            ):
+                merged_messages[-1]["content"].extend(blocks)
             else:
-                merged_messages[-1]["content"] += "\n" + message["content"]
+                merged_messages.append({"role": message["role"], "content": blocks})
         return merged_messages
@@ -1,14 +1,16 @@
 # Implement a base llm type with the following init parameters:
 # model: str
 # config: Config
+import asyncio
 import dataclasses
 
 # There should be an abstract method get_model that returns the model value
 # There should be an abstract method get_token_limit that returns the model token limit
-# There should be an abstract method `chat` that takes messages and returns a dictionary
+# There should be an abstract method `_chat` that takes messages and returns a dictionary;
+# `chat` wraps it with the response cache
 
 from abc import ABC, abstractmethod
-from typing import List, Optional, Union, Dict, Tuple, Type
+from typing import Any, Callable, ClassVar, List, Optional, Union, Dict, Tuple, Type
 
 from rich.panel import Panel
 from rich.progress_bar import ProgressBar
@@ -21,33 +23,222 @@ from llms.base_types import (
     OpenAIDecodingArguments,
     AnthropicDecodingArguments,
 )
+from llms.rate_limiter import RateLimiter, estimate_request_tokens, get_rate_limiter
+from llms.response_cache import ResponseCache, get_response_cache
+from lib import logger
+from utils.state_digest import compact_json
 
 
 class BaseLLM(ABC):
+    # key of the provider's rate limits (see llms.rate_limiter); "" for none
+    provider: ClassVar[str] = ""
+
     def __init__(
         self,
         model: Union[OpenAiChatModels, AnthropicModels],
         config: Config,
         title: str,
+        response_cache: Optional[ResponseCache] = None,
     ):
         self.model = model
         self.model_name = str(model.value)
         self.config = config
         self.title = title
+        self.response_cache = response_cache or get_response_cache(config)
+
+    def _cache_key(
+        self,
+        messages: List,
+        decoding_args: Optional[
+            Union[OpenAIDecodingArguments, AnthropicDecodingArguments]
+        ],
+        kwargs: Dict,
+    ) -> Optional[str]:
+        # only deterministic requests are replayed; sampling at a higher temperature
+        # is expected to give a different answer on every call
+        if (
+            self.response_cache is None
+            or decoding_args is None
+            or decoding_args.temperature != 0
+            or getattr(decoding_args, "stream", False)
+        ):
+            return None
+        return ResponseCache.make_key(self.model_name, messages, decoding_args, kwargs)
+
+    def get_usage_tokens(self, response) -> Optional[int]:
+        """Total tokens a provider response counted against the rate limit, if known."""
+        return None
+
+    def _rate_limit(
+        self, messages: List, decoding_args
+    ) -> Tuple[Optional[RateLimiter], int]:
+        limiter = get_rate_limiter(self.provider, self.model_name, self.config)
+        if limiter is None:
+            return None, 0
+        estimate = estimate_request_tokens(
+            messages, getattr(decoding_args, "max_tokens", 0) or 0, self.model_name
+        )
+        self._log_wait(limiter.acquire(estimate))
+        return limiter, estimate
+
+    async def _arate_limit(
+        self, messages: List, decoding_args
+    ) -> Tuple[Optional[RateLimiter], int]:
+        limiter = get_rate_limiter(self.provider, self.model_name, self.config)
+        if limiter is None:
+            return None, 0
+        estimate = estimate_request_tokens(
+            messages, getattr(decoding_args, "max_tokens", 0) or 0, self.model_name
+        )
+        self._log_wait(await limiter.aacquire(estimate))
+        return limiter, estimate
+
+    def _log_wait(self, waited: float):
+        if waited >= 1:
+            logger.info(f"Rate limit: waited {waited:.1f}s for {self.model_name}")
+
+    def _settle(self, limiter: Optional[RateLimiter], estimate: int, result: dict):
+        if limiter is not None and result.get("response") is not None:
+            limiter.settle(estimate, self.get_usage_tokens(result["response"]))
 
-    @abstractmethod
     def chat(
         self,
         messages: List,
         decoding_args: Union[OpenAIDecodingArguments, AnthropicDecodingArguments],
         **kwargs,
+    ) -> dict:
+        """
+        Returns {"response": <provider response>, "content": <text>}. Responses
+        replayed from the response cache have no provider response ("response" is
+        None) and cost no tokens.
+        """
+        cache_key = self._cache_key(messages, decoding_args, kwargs)
+        if cache_key and (content := self.response_cache.get(cache_key)) is not None:
+            return {"response": None, "content": content}
+        limiter, estimate = self._rate_limit(messages, decoding_args)
+        result = self._chat(messages, decoding_args, **kwargs)
+        self._settle(limiter, estimate, result)
+        # failed calls come back without a provider response and are not cached
+        if cache_key and result.get("response") is not None:
+            self.response_cache.put(cache_key, result["content"])
+        return result
+
+    async def achat(
+        self,
+        messages: List,
+        decoding_args: Union[OpenAIDecodingArguments, AnthropicDecodingArguments],
+        **kwargs,
+    ) -> dict:
+        """Coroutine counterpart of `chat`, sharing its response cache."""
+        cache_key = self._cache_key(messages, decoding_args, kwargs)
+        if cache_key and (content := self.response_cache.get(cache_key)) is not None:
+            return {"response": None, "content": content}
+        limiter, estimate = await self._arate_limit(messages, decoding_args)
+        result = await self._achat(messages, decoding_args, **kwargs)
+        self._settle(limiter, estimate, result)
+        if cache_key and result.get("response") is not None:
+            self.response_cache.put(cache_key, result["content"])
+        return result
+
+    def stream_chat(
+        self,
+        messages: List,
+        decoding_args: Union[OpenAIDecodingArguments, AnthropicDecodingArguments],
+        on_chunk: Callable[[str], None],
+        **kwargs,
+    ) -> dict:
+        """
+        Like `chat`, but streams the completion and calls `on_chunk` with every
+        piece of text as it arrives. Returns the same dict as `chat` once done.
+        """
+        cache_key = self._cache_key(messages, decoding_args, kwargs)
+        if cache_key and (content := self.response_cache.get(cache_key)) is not None:
+            on_chunk(content)
+            return {"response": None, "content": content}
+        limiter, estimate = self._rate_limit(messages, decoding_args)
+        result = self._stream_chat(messages, decoding_args, on_chunk, **kwargs)
+        self._settle(limiter, estimate, result)
+        if cache_key and result.get("response") is not None:
+            self.response_cache.put(cache_key, result["content"])
+        return result
+
+    @abstractmethod
+    def _chat(
+        self,
+        messages: List,
+        decoding_args: Union[OpenAIDecodingArguments, AnthropicDecodingArguments],
+        **kwargs,
     ) -> dict:
         pass
 
+    async def _achat(
+        self,
+        messages: List,
+        decoding_args: Union[OpenAIDecodingArguments, AnthropicDecodingArguments],
+        **kwargs,
+    ) -> dict:
+        """
+        Providers with an async client override this; the default runs `_chat` in a
+        worker thread.
+        """
+        return await asyncio.to_thread(self._chat, messages, decoding_args, **kwargs)
+
+    def _stream_chat(
+        self,
+        messages: List,
+        decoding_args: Union[OpenAIDecodingArguments, AnthropicDecodingArguments],
+        on_chunk: Callable[[str], None],
+        **kwargs,
+    ) -> dict:
+        """
+        Providers that can stream override this; the default delivers the whole
+        completion as a single chunk.
+        """
+        result = self._chat(messages, decoding_args, **kwargs)
+        on_chunk(result["content"])
+        return result
+
+    def native_tool_kwargs(self, tools: List[Tuple[str, str, Dict]]) -> Dict:
+        """
+        Request kwargs registering `tools` ((name, description, json schema of the
+        arguments) triples) as native tool definitions, one of which the model
+        must call.
+        """
+        raise NotImplementedError(
+            f"{type(self).__name__} does not support native tool calling"
+        )
+
+    @staticmethod
+    def tool_calls_content(text: Optional[str], calls: List[Tuple[str, Any]]) -> str:
+        """
+        Native tool calls rendered in the agents' JSON response format, so they
+        are parsed, cached and kept in the conversation like a text response.
+        """
+        return compact_json(
+            {
+                "thought": text or "",
+                "tool_calls": [
+                    {"tool": name, "tool_args": tool_args} for name, tool_args in calls
+                ],
+            }
+        )
+
     def get_token_limit(self) -> Tuple[int, int]:
         return self.model.token_limit
 
-    def log_tokens(self, input_tokens: int, output_tokens: int, title: str = ""):
+    def log_tokens(
+        self,
+        input_tokens: int,
+        output_tokens: int,
+        title: str = "",
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0,
+    ):
+        """
+        `input_tokens` is the full prompt size; `cache_read_tokens` and
+        `cache_write_tokens` are the parts of it served from and written to the
+        provider's prompt cache.
+        """
         title = title or self.title
         max_input_tokens, max_output_tokens = self.get_token_limit()
 
@@ -90,4 +281,14 @@ class BaseLLM(ABC):
             ),
             f"([{output_color}]{output_tokens}[/]/{max_output_tokens}) • [{output_color}]{output_percentage:.2%}[/]",
         )
+        if cache_read_tokens or cache_write_tokens:
+            cached_percentage = cache_read_tokens / input_tokens if input_tokens else 0.0
+            grid.add_row(
+                "Cache",
+                ProgressBar(
+                    total=input_tokens or 1,
+                    completed=cache_read_tokens,
+                ),
+                f"([green]{cache_read_tokens}[/] read, {cache_write_tokens} written) • [green]{cached_percentage:.2%}[/]",
+            )
         console.print(Panel(grid, title=title, expand=True))
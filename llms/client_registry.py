@@ -0,0 +1,113 @@
+import asyncio
+import atexit
+import threading
+import weakref
+from typing import Any, Dict, Literal, Optional, Tuple
+
+import anthropic
+import httpx
+from openai import AsyncOpenAI, OpenAI
+
+from config import Config, config as default_config
+from lib.logger import SingletonMeta
+
+Provider = Literal["openai", "anthropic"]
+
+
+class ClientRegistry(metaclass=SingletonMeta):
+    """
+    Process-wide registry of provider SDK clients keyed by (provider, api key).
+    Every LLM instance with the same credentials shares one keep-alive connection
+    pool, so TLS handshakes are paid once per process rather than once per agent.
+    Pool size and timeouts come from the config (`llm_max_connections`,
+    `llm_max_keepalive_connections`, `llm_timeout`, `llm_connect_timeout`).
+    The SDKs' own retries are disabled; callers retry through `llms.retry`.
+
+    Async connection pools are bound to the event loop they were opened on, so
+    async clients are additionally keyed by the running loop.
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        self.config = config or default_config
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        # event loop -> (provider, api key) -> async client
+        self._async_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+        atexit.register(self.close)
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.config.llm_max_connections,
+            max_keepalive_connections=self.config.llm_max_keepalive_connections,
+        )
+
+    def _timeout(self) -> httpx.Timeout:
+        return httpx.Timeout(
+            self.config.llm_timeout, connect=self.config.llm_connect_timeout
+        )
+
+    def _create_client(self, provider: Provider, api_key: str):
+        if provider == "openai":
+            http_client = httpx.Client(limits=self._limits(), timeout=self._timeout())
+            return OpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+        if provider == "anthropic":
+            # the SDK's own httpx subclass keeps its default redirect handling
+            http_client_class = getattr(anthropic, "DefaultHttpxClient", httpx.Client)
+            http_client = http_client_class(
+                limits=self._limits(), timeout=self._timeout()
+            )
+            return anthropic.Anthropic(
+                api_key=api_key, http_client=http_client, max_retries=0
+            )
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    def _create_async_client(self, provider: Provider, api_key: str):
+        if provider == "openai":
+            http_client = httpx.AsyncClient(
+                limits=self._limits(), timeout=self._timeout()
+            )
+            return AsyncOpenAI(
+                api_key=api_key, http_client=http_client, max_retries=0
+            )
+        if provider == "anthropic":
+            http_client_class = getattr(
+                anthropic, "DefaultAsyncHttpxClient", httpx.AsyncClient
+            )
+            http_client = http_client_class(
+                limits=self._limits(), timeout=self._timeout()
+            )
+            return anthropic.AsyncAnthropic(
+                api_key=api_key, http_client=http_client, max_retries=0
+            )
+        raise ValueError(f"Unknown LLM provider: {provider}")
+
+    def get_client(self, provider: Provider, api_key: str):
+        key = (provider, api_key)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = self._create_client(provider, api_key)
+                self._clients[key] = client
+        return client
+
+    def get_async_client(self, provider: Provider, api_key: str):
+        """Returns the async client for the running event loop."""
+        loop = asyncio.get_running_loop()
+        key = (provider, api_key)
+        with self._lock:
+            clients = self._async_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None:
+                client = self._create_async_client(provider, api_key)
+                clients[key] = client
+        return client
+
+    def close(self):
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+
+client_registry = ClientRegistry()
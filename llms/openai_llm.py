@@ -1,27 +1,52 @@
-from typing import List, Optional, Union
+import json
+from types import SimpleNamespace
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from config.settings import Config
-from openai import OpenAI
+from openai import AsyncOpenAI
+from openai.types import CompletionUsage
 
 from .base_llm import BaseLLM
+from .client_registry import client_registry
 from .base_types import OpenAiChatModels, OpenAIDecodingArguments, ModelType
+from .token_counter import count_message_tokens, count_tokens
 
 
 class OpenAiLLM(BaseLLM):
+    provider = "openai"
+
     def __init__(self, model: OpenAiChatModels, config: Config, title: str):
         super().__init__(model=model, config=config, title=title)
         self.api_key = config.openai_api_key
-        self.client = OpenAI(api_key=self.api_key)
+        self.client = client_registry.get_client("openai", self.api_key)
 
     def get_model(self):
         return self.model.value
 
-    def chat(
+    def _get_async_client(self) -> AsyncOpenAI:
+        return client_registry.get_async_client("openai", self.api_key)
+
+    def get_usage_tokens(self, response) -> Optional[int]:
+        return response.usage.prompt_tokens + response.usage.completion_tokens
+
+    @staticmethod
+    def _without_cache_flags(messages: List) -> List:
+        # `cache` flags mark prompt cache breakpoints for Anthropic; OpenAI caches
+        # long prefixes on its own and rejects unknown message keys
+        return [
+            {key: value for key, value in message.items() if key != "cache"}
+            if isinstance(message, dict) and "cache" in message
+            else message
+            for message in messages
+        ]
+
+    def _chat(
         self,
         messages: List,
         decoding_args: Optional[OpenAIDecodingArguments] = None,
         **kwargs,
     ) -> dict:
         assert len(messages) > 0, "Messages list cannot be empty"
+        messages = self._without_cache_flags(messages)
         try:
             client = self.client
             if self.model.type == ModelType.TEXT:
@@ -66,17 +91,104 @@ class OpenAiLLM(BaseLLM):
                 **decoding_args.__dict__,
                 **kwargs,
             )
-            content = response.choices[0].message.content
-            self.log_tokens(
-                input_tokens=response.usage.prompt_tokens,
-                output_tokens=response.usage.completion_tokens,
-                title=self.title,
-            )
-            return {"response": response, "content": content}
+            return self._completion_result(response)
 
         except Exception as exception:
             raise exception
 
+    def _completion_result(self, response) -> dict:
+        self.log_tokens(
+            input_tokens=response.usage.prompt_tokens,
+            output_tokens=response.usage.completion_tokens,
+            title=self.title,
+        )
+        message = response.choices[0].message
+        content = message.content
+        if getattr(message, "tool_calls", None):
+            content = self.tool_calls_content(
+                content,
+                [
+                    (call.function.name, json.loads(call.function.arguments or "{}"))
+                    for call in message.tool_calls
+                ],
+            )
+        return {"response": response, "content": content}
+
+    def native_tool_kwargs(self, tools: List[Tuple[str, str, Dict]]) -> Dict:
+        return {
+            "tools": [
+                {
+                    "type": "function",
+                    "function": {
+                        "name": name,
+                        "description": description,
+                        "parameters": parameters,
+                    },
+                }
+                for name, description, parameters in tools
+            ],
+            "tool_choice": "required",
+        }
+
+    async def _achat(
+        self,
+        messages: List,
+        decoding_args: Optional[OpenAIDecodingArguments] = None,
+        **kwargs,
+    ) -> dict:
+        assert len(messages) > 0, "Messages list cannot be empty"
+        if self.model.type not in (ModelType.TEXT, ModelType.IMAGE):
+            return await super()._achat(messages, decoding_args, **kwargs)
+        decoding_args = decoding_args or OpenAIDecodingArguments()
+        messages = self._without_cache_flags(messages)
+        response = await self._get_async_client().chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            **decoding_args.__dict__,
+            **kwargs,
+        )
+        return self._completion_result(response)
+
+    def _stream_chat(
+        self,
+        messages: List,
+        decoding_args: Optional[OpenAIDecodingArguments],
+        on_chunk: Callable[[str], None],
+        **kwargs,
+    ) -> dict:
+        assert len(messages) > 0, "Messages list cannot be empty"
+        if self.model.type not in (ModelType.TEXT, ModelType.IMAGE):
+            return super()._stream_chat(messages, decoding_args, on_chunk, **kwargs)
+        decoding_args = decoding_args or OpenAIDecodingArguments()
+        messages = self._without_cache_flags(messages)
+        stream = self.client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            **{**decoding_args.__dict__, "stream": True},
+            **kwargs,
+        )
+        parts = []
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                on_chunk(parts[-1])
+        content = "".join(parts)
+        # streamed chunks carry no usage in this SDK version, so it is counted here
+        # to keep rate limiting and token accounting working
+        prompt_tokens = count_message_tokens(messages, self.model_name)
+        completion_tokens = count_tokens(content, self.model_name)
+        usage = CompletionUsage(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+        )
+        self.log_tokens(
+            input_tokens=prompt_tokens,
+            output_tokens=completion_tokens,
+            title=self.title,
+        )
+        return {"response": SimpleNamespace(usage=usage), "content": content}
+
     def _vision_completion(
         self,
         messages: List,
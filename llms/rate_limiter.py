@@ -0,0 +1,156 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from config import Config, config as default_config
+from llms.token_counter import count_message_tokens
+
+
+class TokenBucket:
+    """A bucket of `capacity` units refilled continuously over one minute."""
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.rate = capacity / 60.0
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute budget for one provider and model;
+    either limit may be None to leave it unlimited. Callers reserve one request
+    and an estimate of the tokens it will use before sending it, and settle the
+    estimate against the actual usage afterwards.
+    Waiting callers are served strictly in arrival order, so one large request
+    cannot be starved by a stream of small ones.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        self.requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self._condition = threading.Condition(self._lock)
+        self._queue: deque = deque()
+        self._tickets = itertools.count()
+
+    def _try_reserve(self, ticket: int, tokens: int) -> float:
+        """Reserves the budget if `ticket` is first in line; returns the wait otherwise."""
+        now = time.monotonic()
+        buckets = [
+            (bucket, amount)
+            for bucket, amount in ((self.requests, 1), (self.tokens, tokens))
+            if bucket is not None
+        ]
+        for bucket, _ in buckets:
+            bucket.refill(now)
+        if self._queue[0] != ticket:
+            return -1.0
+        wait = max((bucket.wait_time(amount) for bucket, amount in buckets), default=0)
+        if wait == 0:
+            for bucket, amount in buckets:
+                bucket.level -= amount
+            self._queue.popleft()
+            self._condition.notify_all()
+        return wait
+
+    def _enqueue(self, tokens: int) -> Tuple[int, int]:
+        # a request larger than the whole budget would otherwise wait forever
+        if self.tokens is not None:
+            tokens = min(tokens, int(self.tokens.capacity))
+        return next(self._tickets), tokens
+
+    def acquire(self, tokens: int) -> float:
+        """Blocks until one request and `tokens` tokens are available; returns the wait."""
+        start = time.monotonic()
+        with self._condition:
+            ticket, tokens = self._enqueue(tokens)
+            self._queue.append(ticket)
+            while (wait := self._try_reserve(ticket, tokens)) != 0:
+                self._condition.wait(timeout=wait if wait > 0 else None)
+        return time.monotonic() - start
+
+    async def aacquire(self, tokens: int) -> float:
+        """Coroutine counterpart of `acquire`; waits without blocking the loop."""
+        start = time.monotonic()
+        with self._lock:
+            ticket, tokens = self._enqueue(tokens)
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._lock:
+                    wait = self._try_reserve(ticket, tokens)
+                if wait == 0:
+                    return time.monotonic() - start
+                await asyncio.sleep(wait if wait > 0 else 0.01)
+        except asyncio.CancelledError:
+            with self._condition:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                    self._condition.notify_all()
+            raise
+
+    def settle(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        """Returns over-estimated tokens to the budget, or charges the shortfall."""
+        if actual_tokens is None or self.tokens is None:
+            return
+        with self._condition:
+            self.tokens.level = min(
+                self.tokens.capacity,
+                self.tokens.level + estimated_tokens - actual_tokens,
+            )
+            self._condition.notify_all()
+
+
+_rate_limiters: Dict[Tuple[str, str], Optional[RateLimiter]] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(
+    provider: str, model_name: str, config: Optional[Config] = None
+) -> Optional[RateLimiter]:
+    """
+    Returns the process-wide limiter for `provider`/`model_name`. Limits are read
+    from `config.llm_rate_limits` ("provider/model" first, then "provider"), each
+    with an optional "rpm" and "tpm"; None when no limit is configured, which is
+    the default.
+    """
+    config = config or default_config
+    key = (provider, model_name)
+    with _rate_limiters_lock:
+        if key not in _rate_limiters:
+            limits = (
+                config.llm_rate_limits.get(f"{provider}/{model_name}")
+                or config.llm_rate_limits.get(provider)
+            )
+            _rate_limiters[key] = (
+                RateLimiter(limits.get("rpm"), limits.get("tpm"))
+                if limits and (limits.get("rpm") or limits.get("tpm"))
+                else None
+            )
+        return _rate_limiters[key]
+
+
+def estimate_request_tokens(
+    messages: List, max_tokens: int = 0, model_name: str = ""
+) -> int:
+    """Pre-flight size of a request: its prompt tokens plus the output budget."""
+    return count_message_tokens(messages, model_name) + max_tokens
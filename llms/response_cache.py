@@ -0,0 +1,169 @@
+import atexit
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from config import Config, config as default_config
+from lib import logger
+
+
+class ResponseCache:
+    """
+    Exact-match cache of LLM response contents keyed by model, messages, decoding
+    args and extra request kwargs. Recent entries live in an in-memory LRU of
+    `max_memory_entries`; every entry is also written to a SQLite file under
+    `cache_dir`, whose least recently used rows are evicted once the stored
+    contents exceed `max_disk_bytes`. Pass `cache_dir=None` for a memory-only cache.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_memory_entries: int = 512,
+        max_disk_bytes: int = 256 * 1024 * 1024,
+    ):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0,
+            "evictions": 0,
+        }
+
+        self.conn: Optional[sqlite3.Connection] = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self.conn = sqlite3.connect(
+                os.path.join(cache_dir, "responses.db"), check_same_thread=False
+            )
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    accessed REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed);
+                """
+            )
+            self.conn.commit()
+
+    @staticmethod
+    def make_key(
+        model_name: str, messages: List, decoding_args: Any, kwargs: Dict
+    ) -> str:
+        if dataclasses.is_dataclass(decoding_args):
+            decoding_args = dataclasses.asdict(decoding_args)
+        payload = json.dumps(
+            [model_name, messages, decoding_args, kwargs], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _remember(self, key: str, content: str):
+        self._memory[key] = content
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return self._memory[key]
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT content FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row:
+                    with self.conn:
+                        self.conn.execute(
+                            "UPDATE responses SET accessed = ? WHERE key = ?",
+                            (time.time(), key),
+                        )
+                    self._remember(key, row[0])
+                    self._stats["disk_hits"] += 1
+                    return row[0]
+            self._stats["misses"] += 1
+            return None
+
+    def put(self, key: str, content: str):
+        with self._lock:
+            self._remember(key, content)
+            self._stats["writes"] += 1
+            if self.conn is None:
+                return
+            with self.conn:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, content, size, accessed) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, content, len(content.encode()), time.time()),
+                )
+                self._evict()
+
+    def _evict(self):
+        total_size = self.conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+        while total_size > self.max_disk_bytes:
+            row = self.conn.execute(
+                "SELECT key, size FROM responses ORDER BY accessed LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (row[0],))
+            self._memory.pop(row[0], None)
+            self._stats["evictions"] += 1
+            total_size -= row[1]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hits"] = hits
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        return stats
+
+    def log_stats(self):
+        stats = self.stats()
+        if stats["hits"] or stats["misses"]:
+            logger.info(
+                f"LLM response cache: {stats['hits']} hits "
+                f"({stats['memory_hits']} memory, {stats['disk_hits']} disk), "
+                f"{stats['misses']} misses, {stats['evictions']} evictions, "
+                f"hit rate {stats['hit_rate']:.1%}"
+            )
+
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache(config: Optional[Config] = None) -> Optional[ResponseCache]:
+    """Returns the process-wide response cache, or None unless `config.llm_cache` is on."""
+    global _response_cache
+    config = config or default_config
+    if not config.llm_cache:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                cache_dir=config.llm_cache_dir,
+                max_memory_entries=config.llm_cache_max_memory_entries,
+                max_disk_bytes=int(config.llm_cache_max_disk_mb * 1024 * 1024),
+            )
+            atexit.register(_response_cache.log_stats)
+    return _response_cache
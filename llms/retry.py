@@ -0,0 +1,147 @@
+import asyncio
+import email.utils
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import anthropic
+import httpx
+import openai
+
+from config import Config
+from lib import logger
+
+T = TypeVar("T")
+
+# Throttling, conflicts, timeouts and server errors; 529 is Anthropic's "overloaded"
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504, 529}
+CONNECTION_ERRORS = (
+    openai.APIConnectionError,
+    anthropic.APIConnectionError,
+    httpx.TransportError,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Malformed model output, throttling, server errors and connection problems are
+    worth another attempt; any other error (bad request, authentication, a bug)
+    fails the same way every time.
+    """
+    if isinstance(error, json.JSONDecodeError):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    return isinstance(error, CONNECTION_ERRORS)
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from the Retry-After headers."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            value = headers["retry-after"]
+            try:
+                return float(value)
+            except ValueError:
+                retry_at = email.utils.parsedate_to_datetime(value)
+                return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+@dataclass
+class RetryPolicy:
+    """
+    Retries retryable errors (see `is_retryable`) up to `max_attempts` attempts in
+    total. Waits are exponential backoff with full jitter capped at `max_delay`,
+    but never shorter than the provider's Retry-After; if Retry-After asks for
+    more than `max_delay`, the call gives up instead of retrying early. Malformed
+    output is retried straight away. No new attempt starts once `deadline`
+    seconds have passed since the first one.
+    """
+
+    max_attempts: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    deadline: Optional[float] = 300.0
+
+    @classmethod
+    def from_config(cls, config: Config, max_attempts: int = 5) -> "RetryPolicy":
+        return cls(
+            max_attempts=max_attempts,
+            base_delay=config.llm_retry_base_delay,
+            max_delay=config.llm_retry_max_delay,
+            deadline=config.llm_retry_deadline or None,
+        )
+
+    def get_delay(self, attempt: int, error: Exception) -> float:
+        if isinstance(error, json.JSONDecodeError):
+            return 0.0
+        backoff = min(self.max_delay, self.base_delay * 2 ** (attempt - 1))
+        # an attempt before Retry-After is sure to be throttled again
+        return max(get_retry_after(error) or 0.0, random.uniform(0, backoff))
+
+    def _next_delay(
+        self, attempt: int, error: Exception, start: float, description: str
+    ) -> float:
+        """Returns how long to wait before the next attempt, or re-raises `error`."""
+        if not is_retryable(error):
+            logger.error(f"{description} failed with a non-retryable error: {error}")
+            raise error
+        if attempt >= self.max_attempts:
+            logger.critical(f"{description}: max retries reached: {error}")
+            raise error
+        delay = self.get_delay(attempt, error)
+        if delay > self.max_delay:
+            logger.critical(
+                f"{description}: giving up, Retry-After of {delay:.1f}s exceeds the {self.max_delay:g}s max delay: {error}"
+            )
+            raise error
+        if (
+            self.deadline is not None
+            and time.monotonic() - start + delay > self.deadline
+        ):
+            logger.critical(
+                f"{description}: giving up, the {self.deadline:g}s deadline would pass: {error}"
+            )
+            raise error
+        logger.warning(
+            f"{description} failed ({error}); attempt {attempt + 1}/{self.max_attempts} in {delay:.1f}s"
+        )
+        return delay
+
+    def call(self, fn: Callable[[], T], description: str = "LLM call") -> T:
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return fn()
+            except Exception as error:
+                delay = self._next_delay(attempt, error, start, description)
+            time.sleep(delay)
+
+    async def acall(
+        self, fn: Callable[[], Awaitable[T]], description: str = "LLM call"
+    ) -> T:
+        start = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                return await fn()
+            except Exception as error:
+                delay = self._next_delay(attempt, error, start, description)
+            await asyncio.sleep(delay)
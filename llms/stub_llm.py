@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import Config
+from llms.base_llm import BaseLLM
+
+
+def default_stub_response(messages: List[Dict[str, str]]) -> str:
+    # The last line of the prompt names the file or folder being documented
+    subject = messages[-1]["content"].strip().splitlines()[-1]
+    return f"# Documentation\nStub documentation for {subject}\n# Summary\nStub summary for {subject}"
+
+
+class StubLLM(BaseLLM):
+    """
+    Local stand-in for a chat model: returns canned responses without any network
+    call, optionally after a fixed latency, and counts the calls it receives. Used
+    to exercise pipelines such as the documentation generator offline.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        title: str = "Stub LLM",
+        responder: Optional[Callable[[List[Dict[str, str]]], str]] = None,
+        latency: float = 0.0,
+    ):
+        self.model = None
+        self.model_name = "stub"
+        self.config = config
+        self.title = title
+        # stub responses carry no provider response, so they are never cached
+        self.response_cache = None
+        self.responder = responder or default_stub_response
+        self.latency = latency
+        self.num_calls = 0
+        self._lock = threading.Lock()
+
+    def get_token_limit(self) -> Tuple[int, int]:
+        return 200_000, 8192
+
+    def _count_call(self):
+        with self._lock:
+            self.num_calls += 1
+
+    def _chat(self, messages: List, decoding_args=None, **kwargs) -> dict:
+        assert len(messages) > 0, "Messages list cannot be empty"
+        self._count_call()
+        if self.latency:
+            time.sleep(self.latency)
+        return {"response": None, "content": self.responder(messages)}
+
+    async def _achat(self, messages: List, decoding_args=None, **kwargs) -> dict:
+        assert len(messages) > 0, "Messages list cannot be empty"
+        self._count_call()
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return {"response": None, "content": self.responder(messages)}
+
+    def _stream_chat(
+        self,
+        messages: List,
+        decoding_args=None,
+        on_chunk: Callable[[str], None] = None,
+        **kwargs,
+    ) -> dict:
+        assert len(messages) > 0, "Messages list cannot be empty"
+        self._count_call()
+        content = self.responder(messages)
+        # the latency is spread over the chunks, like tokens arriving over time
+        chunks = [content[i : i + 8] for i in range(0, len(content), 8)] or [""]
+        for chunk in chunks:
+            if self.latency:
+                time.sleep(self.latency / len(chunks))
+            on_chunk(chunk)
+        return {"response": None, "content": content}
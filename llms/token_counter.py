@@ -0,0 +1,59 @@
+import functools
+from typing import Dict, List
+
+try:
+    import tiktoken
+except ImportError:
+    # tiktoken is a requirement; this only keeps a broken install usable
+    tiktoken = None
+
+# Tokens a chat API adds around every message (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+# Used for models tiktoken does not know (e.g. Anthropic's); close enough to size a prompt
+FALLBACK_ENCODING = "cl100k_base"
+
+
+@functools.lru_cache(maxsize=None)
+def _get_encoding(model_name: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_name)
+    except KeyError:
+        return tiktoken.get_encoding(FALLBACK_ENCODING)
+
+
+@functools.lru_cache(maxsize=4096)
+def _count_text_tokens(text: str, model_name: str) -> int:
+    encoding = _get_encoding(model_name)
+    if encoding is None:
+        # ~4 characters per token for English text and code
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_tokens(text: str, model_name: str = "") -> int:
+    """
+    Tokens in `text` for `model_name`, counted with tiktoken (a characters/4
+    estimate only if it cannot be imported). Counts are memoized, so re-counting
+    an unchanged conversation history every turn is cheap.
+    """
+    if not text:
+        return 0
+    return _count_text_tokens(text, model_name)
+
+
+def _message_text(message) -> str:
+    content = message.get("content") if isinstance(message, dict) else message
+    if isinstance(content, list):
+        return "".join(str(block.get("text", "")) for block in content)
+    return str(content or "")
+
+
+def count_message_tokens(messages: List[Dict], model_name: str = "") -> int:
+    """Prompt size of a list of chat messages, including per-message overhead."""
+    return sum(
+        count_tokens(_message_text(message), model_name) + MESSAGE_OVERHEAD_TOKENS
+        for message in messages
+    )
+
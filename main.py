@@ -1,6 +1,7 @@
+import asyncio
 import datetime
 import json
-from typing import Literal, List
+from typing import Dict, Literal, List, Optional, Tuple
 
 import questionary
 from questionary import Separator
@@ -24,14 +25,33 @@ from llms import (
 from uuid import uuid4
 
 
-def run_context_collector_agent(
-    root_doc: Doc, user_input: str, directory: str, title: str, id: str
+def load_finished_stage(dir_path: str, file_name: str):
+    """The saved result of a pipeline stage that already finished, or None."""
+    file_path = os.path.join(dir_path, file_name)
+    if not os.path.exists(file_path):
+        return None
+    logger.info(f"Reusing the finished stage result {file_path}")
+    with open(file_path) as f:
+        return json.load(f)
+
+
+async def arun_context_collector_agent(
+    root_doc: Doc,
+    user_input: str,
+    directory: str,
+    title: str,
+    id: str,
+    resume: bool = False,
 ):
+    dir_path = f"saved_states/features/{id}/context_collector"
+    if resume and (response := load_finished_stage(dir_path, "output.json")):
+        return response
     context_collector_agent = ContextCollectorAgent(
         root_doc=root_doc, title=title, max_dependency_analysis_depth=3
     )
-    response = context_collector_agent.run(directory=directory, user_input=user_input)
-    dir_path = f"saved_states/features/{id}/context_collector"
+    response = await context_collector_agent.arun(
+        directory=directory, user_input=user_input
+    )
     os.makedirs(dir_path, exist_ok=True)
     with open(os.path.join(dir_path, "prompts.txt"), "w") as f:
         f.write(f"# USER REQUEST\n{user_input}")
@@ -40,29 +60,52 @@ def run_context_collector_agent(
     return response
 
 
-def run_exploration_agent(root_doc: Doc, user_prompt: str, directory: str, id: str):
-    directory_overview = ListFiles(root_doc=root_doc, directory=directory).run()
-    exploration_prompt = transform_query_to_exploration_prompt(
-        query=user_prompt, directory_overview=directory_overview["response"]
-    )
-    exploration_prompt += (
-        "\n"
-        "Always remember to note how the directory structure for this particular feature, "
-        "and how and where it is being integrated in the codebase."
-    )
+async def arun_exploration_agent(
+    root_doc: Doc, user_prompt: str, directory: str, id: str, resume: bool = False
+):
+    """
+    With `resume`, a finished exploration is reused and an interrupted one
+    continues from its checkpoint.
+    """
+    dir_path = f"saved_states/features/{id}/exploration"
+    prompts_path = os.path.join(dir_path, "prompts.txt")
+    checkpoint_path = os.path.join(dir_path, "checkpoint.json")
+    if resume and (
+        exploration_context := load_finished_stage(dir_path, "output.json")
+    ):
+        return exploration_context
+
+    if resume and os.path.exists(checkpoint_path) and os.path.exists(prompts_path):
+        # the checkpointed conversation already contains the exploration prompt
+        with open(prompts_path) as f:
+            exploration_prompt = f.read().split("# EXPLORATION PROMPT\n", 1)[-1]
+    else:
+        directory_overview = ListFiles(root_doc=root_doc, directory=directory).run()
+        exploration_prompt = await atransform_query_to_exploration_prompt(
+            query=user_prompt, directory_overview=directory_overview["response"]
+        )
+        exploration_prompt += (
+            "\n"
+            "Always remember to note how the directory structure for this particular feature, "
+            "and how and where it is being integrated in the codebase."
+        )
+        os.makedirs(dir_path, exist_ok=True)
+        with open(prompts_path, "w") as f:
+            prompt_str = (
+                f"# USER REQUEST\n{user_prompt}\n"
+                f"# EXPLORATION PROMPT\n{exploration_prompt}"
+            )
+            f.write(prompt_str)
     logger.info(f"Exploration Prompt: {exploration_prompt}")
-    exploration_agent = ExplorationAgent(root_doc=root_doc, title="Exploration Agent")
-    response = exploration_agent.run(
-        user_prompt=exploration_prompt, directory=directory
+    exploration_agent = ExplorationAgent(
+        root_doc=root_doc,
+        title="Exploration Agent",
+        checkpoint_path=checkpoint_path,
+    )
+    response = await exploration_agent.arun(
+        user_prompt=exploration_prompt, directory=directory, resume=resume
     )
     exploration_context = exploration_agent.context
-    dir_path = f"saved_states/features/{id}/exploration"
-    os.makedirs(dir_path, exist_ok=True)
-    with open(os.path.join(dir_path, "prompts.txt"), "w") as f:
-        prompt_str = (
-            f"# USER REQUEST\n{user_prompt}\n# EXPLORATION PROMPT\n{exploration_prompt}"
-        )
-        f.write(prompt_str)
     with open(os.path.join(dir_path, "output.json"), "w") as f:
         f.write(json.dumps(exploration_context, indent=4))
     with open(os.path.join(dir_path, "finish_response.json"), "w") as f:
@@ -82,16 +125,13 @@ def run_exploration_agent(root_doc: Doc, user_prompt: str, directory: str, id: s
     return exploration_context
 
 
-def transform_query_to_exploration_prompt(query: str, directory_overview: str):
+def _exploration_prompt_request(
+    query: str, directory_overview: str
+) -> Tuple[OpenAiLLM, Dict]:
     llm = OpenAiLLM(
         model=OpenAiChatModels.GPT_4O, config=config, title="Query to Exploration"
     )
-    an_llm = AnthropicLLM(
-        model=AnthropicModels.CLAUDE_3_5_SONNET_20240620,
-        config=config,
-        title="Query to Exploration",
-    )
-    response = llm.chat(
+    return llm, dict(
         messages=[
             {"role": "system", "content": "You are a helpful coding assistant"},
             {
@@ -115,23 +155,47 @@ def transform_query_to_exploration_prompt(query: str, directory_overview: str):
             },
         ],
         decoding_args=OpenAIDecodingArguments(
-            temperature=0.1,
+            # only temperature-0 calls are replayed from the response cache
+            temperature=0 if config.llm_cache else 0.1,
             response_format={"type": "json_object"},
         ),
         # decoding_args=AnthropicDecodingArguments(temperature=0.1),
     )
+
+
+def transform_query_to_exploration_prompt(query: str, directory_overview: str):
+    llm, request = _exploration_prompt_request(query, directory_overview)
+    response = llm.chat(**request)
+    response = json.loads(response["content"])
+    return response["exploration_prompt"]
+
+
+async def atransform_query_to_exploration_prompt(
+    query: str, directory_overview: str
+):
+    llm, request = _exploration_prompt_request(query, directory_overview)
+    response = await llm.achat(**request)
     response = json.loads(response["content"])
     return response["exploration_prompt"]
 
 
-def run_planner_agent(
+async def arun_planner_agent(
     root_doc: Doc,
     user_prompt: str,
     directory: str,
     exploration_context: dict,
     model_provider: Literal["openai", "anthropic"],
     id: str,
+    resume: bool = False,
 ):
+    """
+    With `resume`, a finished plan is reused and an interrupted planner run
+    continues from its checkpoint.
+    """
+    dir_path = f"saved_states/features/{id}/planner"
+    if resume and (response := load_finished_stage(dir_path, "finish_response.json")):
+        return response
+
     formatted_str = ""
     if exploration_context:
         formatted_str = ""
@@ -154,12 +218,16 @@ def run_planner_agent(
             f"Relevant Directories:\n{exploration_context.get('similar_feature_dirs')}"
         )
     planer_agent = PlannerAgent(
-        root_doc=root_doc, model_provider=model_provider, title="Planner Agent"
+        root_doc=root_doc,
+        model_provider=model_provider,
+        title="Planner Agent",
+        checkpoint_path=os.path.join(dir_path, "checkpoint.json"),
     )
-    response = planer_agent.run(
+    response = await planer_agent.arun(
         directory=directory,
         user_prompt=user_prompt,
         exploration_context=formatted_str,
+        resume=resume,
     )
     # console.print(f"Final Response: {planer_agent.finish_response}")
     # console.print(f"Final Plan: \n{planer_agent.plan}")
@@ -167,7 +235,6 @@ def run_planner_agent(
     # logger.info(
     #     f"Total tokens: {planer_agent.prompt_tokens}, {planer_agent.completion_tokens}"
     # )
-    dir_path = f"saved_states/features/{id}/planner"
     os.makedirs(dir_path, exist_ok=True)
     with open(os.path.join(dir_path, "prompts.txt"), "w") as f:
         prompt_str = (
@@ -267,11 +334,13 @@ def main():
         with open(file_path, "w") as f:
             f.write(json.dumps(exploration_context, indent=4))
     elif agent_to_run == "Context Collector Agent":
-        response = run_context_collector_agent(
-            root_doc=root_doc,
-            user_input=user_input,
-            directory=directory,
-            title="Context Collector",
+        response = asyncio.run(
+            arun_context_collector_agent(
+                root_doc=root_doc,
+                user_input=user_input,
+                directory=directory,
+                title="Context Collector",
+            )
         )
         console.print(response["response"])
     else:
@@ -279,79 +348,138 @@ def main():
         logger.info(f"Reading exploration context {exp_file_path}")
         exploration_context = open(exp_file_path).read()
         exploration_context = json.loads(exploration_context)
-        _ = run_planner_agent(
-            root_doc=root_doc,
-            user_prompt=user_input,
-            directory=directory,
-            exploration_context=exploration_context,
-            model_provider="openai" if "OpenAI" in model_choice else "anthropic",
+        _ = asyncio.run(
+            arun_planner_agent(
+                root_doc=root_doc,
+                user_prompt=user_input,
+                directory=directory,
+                exploration_context=exploration_context,
+                model_provider="openai" if "OpenAI" in model_choice else "anthropic",
+            )
         )
 
 
-def run_explorer_planner_context_collector(
+async def arun_explorer_planner_context_collector(
     root_path: str,
     directory: str,
     user_request: str,
     model_provider: Literal["openai", "anthropic"] = "openai",
+    task_id: Optional[str] = None,
+    resume: bool = False,
 ):
-    task_id = str(uuid4())
+    task_id = task_id or str(uuid4())
     logger.info(f"RUNNING TASK ID: {task_id}; USER REQUEST: {user_request}")
 
     # with console.status("[bold green] Fetching documentation..."):
-    root_doc = get_doc(root_path)
+    root_doc = await asyncio.to_thread(get_doc, root_path)
 
-    exploration_context = run_exploration_agent(
+    exploration_context = await arun_exploration_agent(
         root_doc=root_doc,
         user_prompt=user_request,
         directory=directory,
         id=task_id,
+        resume=resume,
     )
 
-    _ = run_planner_agent(
+    _ = await arun_planner_agent(
         root_doc=root_doc,
         user_prompt=user_request,
         directory=directory,
         exploration_context=exploration_context,
         model_provider=model_provider,
         id=task_id,
+        resume=resume,
     )
 
-    run_context_collector_agent(
+    await arun_context_collector_agent(
         root_doc=root_doc,
         user_input=user_request,
         directory=directory,
         title="Context Collector",
         id=task_id,
+        resume=resume,
     )
 
 
-def run_cc_exp_pl_parallel(
+def run_explorer_planner_context_collector(
     root_path: str,
     directory: str,
-    user_requests: List[str],
+    user_request: str,
     model_provider: Literal["openai", "anthropic"] = "openai",
+    task_id: Optional[str] = None,
+    resume: bool = False,
 ):
-    import multiprocessing as mp
-    from multiprocessing import Process
-
-    processes = []
-    num_processes = min(
-        len(user_requests),
-        mp.cpu_count(),
-        4,
+    asyncio.run(
+        arun_explorer_planner_context_collector(
+            root_path=root_path,
+            directory=directory,
+            user_request=user_request,
+            model_provider=model_provider,
+            task_id=task_id,
+            resume=resume,
+        )
     )
 
-    from concurrent.futures import ThreadPoolExecutor
 
-    with ThreadPoolExecutor(max_workers=num_processes) as executor:
-        for user_request in user_requests:
-            executor.submit(
-                run_explorer_planner_context_collector,
-                root_path=root_path,
-                directory=directory,
-                user_request=user_request,
-                model_provider=model_provider,
-            )
+def resume_explorer_planner_context_collector(
+    task_id: str,
+    root_path: str,
+    directory: str,
+    user_request: str,
+    model_provider: Literal["openai", "anthropic"] = "openai",
+):
+    """
+    Continues the pipeline of `task_id` after a crash: finished stages are read
+    back from saved_states/features/<task_id>, and an interrupted agent resumes
+    from its last checkpoint without repeating the LLM calls it already made.
+    """
+    run_explorer_planner_context_collector(
+        root_path=root_path,
+        directory=directory,
+        user_request=user_request,
+        model_provider=model_provider,
+        task_id=task_id,
+        resume=True,
+    )
+
+
+def run_cc_exp_pl_parallel(
+    root_path: str,
+    directory: str,
+    user_requests: List[str],
+    model_provider: Literal["openai", "anthropic"] = "openai",
+    max_workers: Optional[int] = None,
+):
+    """
+    Runs the pipeline for every request concurrently on one event loop, with at
+    most `max_workers` (default: `config.pipeline_workers`) in flight. LLM calls
+    go through `BaseLLM.achat`, so waiting on the model ties up no thread.
+    """
+    # The pipelines are I/O bound and every LLM call goes through the shared
+    # per-model rate limiter, so the limit is not tied to the cpu count
+    max_in_flight = max_workers or config.pipeline_workers
+
+    async def run_all():
+        semaphore = asyncio.Semaphore(max_in_flight)
+
+        async def run_one(user_request: str):
+            async with semaphore:
+                await arun_explorer_planner_context_collector(
+                    root_path=root_path,
+                    directory=directory,
+                    user_request=user_request,
+                    model_provider=model_provider,
+                )
+
+        results = await asyncio.gather(
+            *(run_one(user_request) for user_request in user_requests),
+            return_exceptions=True,
+        )
+        for user_request, result in zip(user_requests, results):
+            if isinstance(result, Exception):
+                logger.error(f"Pipeline failed for {user_request!r}: {result}")
+
+    asyncio.run(run_all())
 
 
 if __name__ == "__main__":
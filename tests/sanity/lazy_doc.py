@@ -0,0 +1,48 @@
+import os
+import sys
+import tempfile
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from utils.doc.doc_model import Doc, list_files_in_doc
+from utils.doc.doc_store import DocStore
+from config import console
+
+
+def make_doc(path: str, children=None) -> Doc:
+    return Doc(
+        path=path,
+        children=children or [],
+        documentation=f"docs of {path}",
+        summary=f"summary of {path}",
+    )
+
+
+def main():
+    tree = make_doc(
+        "repo",
+        [
+            make_doc("repo/main.py"),
+            make_doc("repo/utils", [make_doc("repo/utils/helpers.py")]),
+        ],
+    )
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        doc_store = DocStore(os.path.join(tmp_dir, "index.db"))
+        doc_store.save_tree(tree)
+        root_doc = doc_store.load_lazy_tree()
+
+        # the root is found by its own path as well as by the empty path
+        for path in ["repo", "./repo", "repo/", "", "."]:
+            assert root_doc.lookup(path) is root_doc, path
+        assert [doc.path for doc in list_files_in_doc(root_doc, "repo")] == [
+            "repo/main.py",
+            "repo/utils",
+        ]
+        assert root_doc.lookup("repo/utils/helpers.py").path == "repo/utils/helpers.py"
+        assert root_doc.lookup("repo/missing.py") is None
+        doc_store.close()
+    console.print("[bold green]Lazy doc lookups OK[/]")
+
+
+if __name__ == "__main__":
+    main()
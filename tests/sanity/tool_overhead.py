@@ -0,0 +1,65 @@
+import os
+import sys
+import timeit
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from tools import ReadCode, ReadCodeSnippet, ListFiles, FileInfo
+from tools.utils import (
+    _tool_parameters,
+    _tools_subprompt,
+    generate_tools_subprompt,
+    tool_parameters,
+    tool_schema,
+)
+from config import console
+
+TOOLS = {
+    "read_code": ReadCode,
+    "read_snippet": ReadCodeSnippet,
+    "list_files": ListFiles,
+    "file_info": FileInfo,
+}
+TOOL_ARGS = {"file_path": "agents/base_agent.py", "start_line": 1, "end_line": 40}
+# stands in for the agent-supplied objects (root doc, agent instance)
+EXTRA_ARGS = {"root_doc": object(), "exploration_agent_instance": object()}
+
+
+def per_call_us(statement, number: int) -> float:
+    return min(timeit.repeat(statement, number=number, repeat=5)) / number * 1e6
+
+
+def uncached_subprompt():
+    tools = tuple(TOOLS.items())
+    schemas = [tool_schema.__wrapped__(tool) for _, tool in tools]
+    parameters = [_tool_parameters.__wrapped__(tool) for _, tool in tools]
+    return _tools_subprompt.__wrapped__(tools, True), schemas, parameters
+
+
+def cached_subprompt():
+    schemas = [tool_schema(tool) for tool in TOOLS.values()]
+    parameters = [tool_parameters(tool) for tool in TOOLS.values()]
+    return generate_tools_subprompt(TOOLS), schemas, parameters
+
+
+def main():
+    cached_subprompt()
+    results = [
+        ("subprompt + schemas (uncached)", per_call_us(uncached_subprompt, 200)),
+        ("subprompt + schemas (cached)", per_call_us(cached_subprompt, 200)),
+        (
+            "ReadCode(**tool_args, **extra_args)",
+            per_call_us(lambda: ReadCode(**TOOL_ARGS, **EXTRA_ARGS), 20000),
+        ),
+        # skips validation, but is plain Python and slower than pydantic-core
+        (
+            "ReadCode.model_construct(**tool_args)",
+            per_call_us(lambda: ReadCode.model_construct(**TOOL_ARGS), 20000),
+        ),
+    ]
+    for name, microseconds in results:
+        console.print(f"{name:<40} {microseconds:10.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 from abc import abstractmethod
+from typing import ClassVar
+
 from pydantic import BaseModel
 
 
 class BaseTool(BaseModel):
+    # read-only tools have no side effects and may run concurrently with each other
+    read_only: ClassVar[bool] = False
+
     @abstractmethod
     def run(self, *args) -> dict:
         pass
@@ -1,3 +1,4 @@
+from typing import ClassVar
 from pydantic import Field
 
 from utils.doc import Doc, find_doc
@@ -13,6 +14,8 @@ class FileInfo(BaseTool):
     a lot of context, so avoid using them if possible.
     """
 
+    read_only: ClassVar[bool] = True
+
     root_doc: Doc = Field(
         ..., description="The root document to list files in.", exclude=True
     )
@@ -29,12 +32,12 @@ class FileInfo(BaseTool):
 
     def run(self, *args):
         try:
-            exclude = ["children"]
-            logger.debug(f"Excluding: {exclude}")
             if target_doc := find_doc(self.root_doc, self.file_path):
-                return_obj = {
-                    k: v for k, v in target_doc.dict().items() if k not in exclude
-                }
+                return_obj = {"path": target_doc.path}
+                if self.include_summary:
+                    return_obj["summary"] = target_doc.summary
+                if self.include_documentation:
+                    return_obj["documentation"] = target_doc.documentation
                 if self.include_outline:
                     if outline := generate_outline(target_doc):
                         return_obj["outline"] = outline
@@ -1,5 +1,5 @@
 import json
-from typing import Dict, List
+from typing import ClassVar, Dict, List
 
 from pydantic import Field
 import os
@@ -16,6 +16,8 @@ class ListFiles(BaseTool):
     It can also filter files based on the file extension and include the summary and documentation of the file if asked.
     """
 
+    read_only: ClassVar[bool] = True
+
     root_doc: Doc = Field(
         ..., description="The root document to list files in.", exclude=True
     )
@@ -40,27 +42,14 @@ class ListFiles(BaseTool):
 
     def run(self, *args):
         try:
-            exclude = (
-                # ["children"]
-                (["documentation"] if not self.include_documentation else [])
-                + (["summary"] if not self.include_summary else [])
-            )
             if target_doc := find_doc(self.root_doc, self.directory):
-                target_files = []
-                for child in target_doc.children:
-                    # logger.debug(f"File found: {child.path}")
-                    if child.path.endswith(self.file_extension):
-                        # logger.debug(f"File extension matched: {self.file_extension}")
-                        target_files.append(
-                            {
-                                k: v
-                                for k, v in child.model_dump().items()
-                                if k not in exclude
-                            }
-                        )
-                        target_files[-1]["type"] = (
-                            "file" if os.path.isfile(child.path) else "directory"
-                        )
+                # Docs are formatted directly instead of being dumped to dicts, so the
+                # documentation text of the subtree is never touched (or lazily loaded)
+                target_files = [
+                    child
+                    for child in target_doc.children
+                    if child.path.endswith(self.file_extension)
+                ]
                 return {
                     "success": True,
                     "response": "\n".join(self._format_output(target_files)),
@@ -73,25 +62,25 @@ class ListFiles(BaseTool):
             logger.critical(e)
             return {"success": False, "response": e.__str__()}
 
-    def _format_output(self, files_and_dirs: List[Dict], level: int = 0):
+    def _format_output(self, files_and_dirs: List[Doc], level: int = 0):
         formatted_output = []
         for file_or_dir in files_and_dirs:
-            if os.path.isfile(file_or_dir["path"]):
-                formatted_output.append(f"- [File]: {file_or_dir['path']}")
+            if os.path.isfile(file_or_dir.path):
+                formatted_output.append(f"- [File]: {file_or_dir.path}")
             else:
                 formatted_children_output = []
-                if file_or_dir["children"] and (level < self.depth or self.depth == -1):
+                if level < self.depth or self.depth == -1:
                     formatted_children_output = self._format_output(
-                        file_or_dir["children"],
+                        file_or_dir.children or [],
                         level=level + 1,
                     )
                 if formatted_children_output:
-                    formatted_str = f"v [Dir]: {file_or_dir['path']}"
+                    formatted_str = f"v [Dir]: {file_or_dir.path}"
                     formatted_str += ":"
                     for child_str in formatted_children_output:
                         formatted_str += "\n" + "\t" * (level + 1) + child_str
                 else:
-                    formatted_str = f"> [Dir]: {file_or_dir['path']}"
+                    formatted_str = f"> [Dir]: {file_or_dir.path}"
                 formatted_output.append(formatted_str)
 
         return formatted_output
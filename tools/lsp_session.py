@@ -0,0 +1,181 @@
+import atexit
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from monitors4codegen.multilspy import SyncLanguageServer
+from monitors4codegen.multilspy.multilspy_config import MultilspyConfig
+from monitors4codegen.multilspy.multilspy_logger import MultilspyLogger
+
+from config import config
+from lib import logger
+from lib.logger import SingletonMeta
+
+# Failures of the connection to the server itself (broken pipe, closed stream,
+# no answer), as opposed to errors the server returns for a single request
+TRANSPORT_ERRORS = (ConnectionError, EOFError, TimeoutError)
+
+
+class LSPSession:
+    """
+    A single warm language server for one (repo_path, language) pair.
+    The server is started lazily and kept running until `stop` is called.
+    Requests are serialized since the underlying server is not thread safe.
+    """
+
+    def __init__(self, repo_path: str, language: str):
+        self.repo_path = repo_path
+        self.language = language
+        self.last_used = time.monotonic()
+        self._lock = threading.RLock()
+        self._lsp: Optional[SyncLanguageServer] = None
+        self._server_context = None
+
+    @property
+    def is_running(self) -> bool:
+        return self._lsp is not None
+
+    def start(self):
+        with self._lock:
+            if self._lsp is not None:
+                return
+            logger.info(
+                f"[bold green]Starting LSP[/]: {self.language} server for {self.repo_path}"
+            )
+            lsp_config = MultilspyConfig.from_dict({"code_language": self.language})
+            lsp = SyncLanguageServer.create(
+                lsp_config, MultilspyLogger(), self.repo_path
+            )
+            # `start_server` is a context manager; it is entered here and only
+            # exited on `stop` so that the server stays warm between requests
+            server_context = lsp.start_server()
+            server_context.__enter__()
+            self._lsp = lsp
+            self._server_context = server_context
+
+    def stop(self):
+        with self._lock:
+            if self._server_context is None:
+                return
+            logger.info(
+                f"[bold yellow]Stopping LSP[/]: {self.language} server for {self.repo_path}"
+            )
+            try:
+                self._server_context.__exit__(None, None, None)
+            except Exception as e:
+                logger.error(f"Failed to stop LSP server cleanly: {e}")
+            finally:
+                self._lsp = None
+                self._server_context = None
+
+    def restart(self):
+        with self._lock:
+            self.stop()
+            self.start()
+
+    def _process_exited(self) -> bool:
+        language_server = getattr(self._lsp, "language_server", None)
+        process = getattr(getattr(language_server, "server", None), "process", None)
+        return process is not None and process.returncode is not None
+
+    def _is_transport_failure(self, error: Exception) -> bool:
+        return isinstance(error, TRANSPORT_ERRORS) or self._process_exited()
+
+    def request(self, callback: Callable[[SyncLanguageServer], Any]) -> Any:
+        """
+        Run `callback` against the warm server. If the server process died or the
+        connection to it failed, it is restarted and the request retried once.
+        Errors of the request itself (a bad position, a missing file) are raised
+        as they are, since a restart would not change them.
+        """
+        with self._lock:
+            self.last_used = time.monotonic()
+            self.start()
+            try:
+                return callback(self._lsp)
+            except Exception as e:
+                if not self._is_transport_failure(e):
+                    raise
+                logger.warning(
+                    f"LSP request failed ({e}); restarting {self.language} server for {self.repo_path}"
+                )
+                self.restart()
+                return callback(self._lsp)
+            finally:
+                self.last_used = time.monotonic()
+
+
+class LSPSessionManager(metaclass=SingletonMeta):
+    """
+    Process-wide pool of warm language servers keyed by (repo_path, language).
+    Sessions idle for longer than `idle_timeout` seconds are shut down by a
+    background reaper thread.
+    """
+
+    def __init__(self, idle_timeout: Optional[float] = None):
+        self.idle_timeout = (
+            idle_timeout if idle_timeout is not None else config.lsp_idle_timeout
+        )
+        self._sessions: Dict[Tuple[str, str], LSPSession] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        atexit.register(self.shutdown)
+
+    def get_session(self, repo_path: str, language: str) -> LSPSession:
+        key = (os.path.abspath(repo_path), language)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is None:
+                session = LSPSession(repo_path=key[0], language=language)
+                self._sessions[key] = session
+            self._ensure_reaper()
+        return session
+
+    def request(
+        self,
+        repo_path: str,
+        language: str,
+        callback: Callable[[SyncLanguageServer], Any],
+    ) -> Any:
+        return self.get_session(repo_path, language).request(callback)
+
+    def shutdown(self, repo_path: Optional[str] = None):
+        with self._lock:
+            keys = [
+                key
+                for key in self._sessions
+                if repo_path is None or key[0] == os.path.abspath(repo_path)
+            ]
+            sessions = [self._sessions.pop(key) for key in keys]
+            if not self._sessions:
+                self._stop_event.set()
+        for session in sessions:
+            session.stop()
+
+    def _ensure_reaper(self):
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._stop_event.clear()
+        self._reaper = threading.Thread(
+            target=self._reap_idle_sessions, name="lsp-session-reaper", daemon=True
+        )
+        self._reaper.start()
+
+    def _reap_idle_sessions(self):
+        interval = max(min(self.idle_timeout / 2, 30.0), 1.0)
+        while not self._stop_event.wait(interval):
+            now = time.monotonic()
+            with self._lock:
+                idle = [
+                    session
+                    for session in self._sessions.values()
+                    if session.is_running
+                    and now - session.last_used > self.idle_timeout
+                ]
+            for session in idle:
+                session.stop()
+
+
+lsp_session_manager = LSPSessionManager()
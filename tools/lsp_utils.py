@@ -1,16 +1,15 @@
 import os
 import json
-from typing import Dict, List, Optional
+from typing import ClassVar, Dict, List, Optional
 from pydantic import Field
 from dataclasses import dataclass
 from enum import Enum
 
 from monitors4codegen.multilspy import SyncLanguageServer
-from monitors4codegen.multilspy.multilspy_config import MultilspyConfig
-from monitors4codegen.multilspy.multilspy_logger import MultilspyLogger
 
 from lib import logger
 from tools import BaseTool
+from tools.lsp_session import lsp_session_manager
 
 
 class SupportedLanguages(Enum):
@@ -33,6 +32,8 @@ class LSPUtils(BaseTool):
     This tool is used to make requests to the Language Server Protocol (LSP) for a given file. Use this to jump to definitions or find references of a symbol in a file.
     """
 
+    read_only: ClassVar[bool] = True
+
     language: SupportedLanguages = Field(..., description="The language of the code.")
     repo_path: str = Field(..., description="The path to the repository.")
     file_path: str = Field(..., description="The path to the file.")
@@ -54,10 +55,6 @@ class LSPUtils(BaseTool):
             #     self.symbol.strip() != ""
             # ), "Either column_number or symbol must be provided."
 
-            config = MultilspyConfig.from_dict({"code_language": self.language.value})
-            lsp_logger = MultilspyLogger()
-            lsp = SyncLanguageServer.create(config, lsp_logger, self.repo_path)
-
             # Make the line number zero indexed
             self.line_number -= 1
             # Find the column number of the symbol if provided
@@ -73,31 +70,36 @@ class LSPUtils(BaseTool):
                     # symbol should start from the column number and end at the first space
                     self.symbol = line[self.column_number :].split(" ")[0]
 
-            with lsp.start_server():
-                if self.request_type == RequestTypes.DEFINITION:
-                    result = lsp.request_definition(
-                        self.file_path, self.line_number, self.column_number
-                    )
-                elif self.request_type == RequestTypes.COMPLETIONS:
-                    result = lsp.request_completions(
-                        self.file_path, self.line_number, self.column_number
-                    )
-                elif self.request_type == RequestTypes.REFERENCES:
-                    result = lsp.request_references(
-                        self.file_path, self.line_number, self.column_number
-                    )
-                elif self.request_type == RequestTypes.DOCUMENT_SYMBOLS:
-                    result = lsp.request_document_symbols(self.file_path)
-                elif self.request_type == RequestTypes.HOVER:
-                    result = lsp.request_hover(
-                        self.file_path, self.line_number, self.column_number
-                    )
-                else:
-                    return {"success": False, "response": "Invalid request type."}
-                # logger.info(
-                #     f"Requesting {self.request_type} for {self.symbol} at line {self.line_number+1}, column {self.column_number+1} in {self.file_path} :: {result[0]['relativePath']}"
-                # )
-                return {"success": True, "response": result}
+            if self.request_type not in RequestTypes:
+                return {"success": False, "response": "Invalid request type."}
+            # The server is shared and kept warm across calls by the session manager
+            result = lsp_session_manager.request(
+                self.repo_path, self.language.value, self._make_request
+            )
+            # logger.info(
+            #     f"Requesting {self.request_type} for {self.symbol} at line {self.line_number+1}, column {self.column_number+1} in {self.file_path} :: {result[0]['relativePath']}"
+            # )
+            return {"success": True, "response": result}
         except Exception as e:
             logger.critical(f"Failed to make LSP request: {e}")
             return {"success": False, "response": e.__str__()}
+
+    def _make_request(self, lsp: SyncLanguageServer):
+        if self.request_type == RequestTypes.DEFINITION:
+            return lsp.request_definition(
+                self.file_path, self.line_number, self.column_number
+            )
+        elif self.request_type == RequestTypes.COMPLETIONS:
+            return lsp.request_completions(
+                self.file_path, self.line_number, self.column_number
+            )
+        elif self.request_type == RequestTypes.REFERENCES:
+            return lsp.request_references(
+                self.file_path, self.line_number, self.column_number
+            )
+        elif self.request_type == RequestTypes.DOCUMENT_SYMBOLS:
+            return lsp.request_document_symbols(self.file_path)
+        elif self.request_type == RequestTypes.HOVER:
+            return lsp.request_hover(
+                self.file_path, self.line_number, self.column_number
+            )
@@ -1,3 +1,4 @@
+from typing import ClassVar
 from pydantic import Field
 
 from tools import BaseTool
@@ -10,6 +11,8 @@ class ReadCode(BaseTool):
     Only reads 200 lines of code at most at a time.
     """
 
+    read_only: ClassVar[bool] = True
+
     file_path: str = Field(..., description="The path to the code file.")
     start_line: int = Field(1, description="The starting line number.")
     end_line: int = Field(100, description="The ending line number.")
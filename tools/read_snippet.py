@@ -1,6 +1,6 @@
 import ast
 from pydantic import Field
-from typing import Literal
+from typing import ClassVar, Literal
 
 from lib import logger
 from tools import BaseTool
@@ -14,6 +14,8 @@ class ReadCodeSnippet(BaseTool):
     For example, if you want to read a function named 'test' from a file 'test.py', you can use this tool.
     """
 
+    read_only: ClassVar[bool] = True
+
     file_path: str = Field(..., description="The file path to get information about.")
     node_name: str = Field(..., description="The node name to get information about.")
     node_type: Literal["class", "function", "variable"] = Field(
@@ -1,8 +1,14 @@
-import json
+import copy
+import functools
+from utils.state_digest import compact_json
 from pydantic import BaseModel, Field
-from typing import List
+from typing import Dict, List
 
+# schemas and subprompts only depend on the tool classes, which do not change at
+# runtime, so each is built once per process instead of on every agent run
 
+
+@functools.lru_cache(maxsize=None)
 def tool_schema(f: BaseModel):
     schema = f.model_json_schema(mode='serialization')
     schema.pop("type")
@@ -13,15 +19,49 @@ def tool_schema(f: BaseModel):
     # rename "properties" to "args"
     schema["arguments"] = schema.pop("properties")
     schema["required"] = schema.pop("required")
-    return json.dumps(schema, indent=2)
+    return compact_json(schema)
+
+
+def tool_parameters(f: BaseModel) -> Dict:
+    """JSON schema of the arguments the model passes to a tool, for native tool calling."""
+    # a copy, so callers can't edit the cached schema
+    return copy.deepcopy(_tool_parameters(f))
+
+
+@functools.lru_cache(maxsize=None)
+def _tool_parameters(f: BaseModel) -> Dict:
+    schema = f.model_json_schema(mode='serialization')
+    schema.pop("title", None)
+    # the docstring is already the tool's description
+    schema.pop("description", None)
+    for definition in [schema, *schema.get("$defs", {}).values()]:
+        for prop in definition.get("properties", {}).values():
+            prop.pop("title", None)
+    return schema
+
+
+def tool_description(f: BaseModel) -> str:
+    return " ".join((f.__doc__ or "").split())
+
+
+def generate_tools_subprompt(tools, include_schemas: bool = True):
+    """
+    Describes `tools` in the instructions prompt. With native tool calling the
+    schemas are sent as tool definitions instead, so `include_schemas=False`
+    lists only names and descriptions.
+    """
+    return _tools_subprompt(tuple(tools.items()), include_schemas)
 
 
-def generate_tools_subprompt(tools):
+@functools.lru_cache(maxsize=None)
+def _tools_subprompt(tools, include_schemas: bool):
     tool_descriptions = []
-    for tool in tools.keys():
-        f = tools[tool]
+    for tool, f in tools:
         f_doc = f.__doc__ or ""
-        tool_descriptions = tool_descriptions + [f'"{tool}": {f_doc.strip()}\nargs json schema:\n{tool_schema(f)}\n']
+        if include_schemas:
+            tool_descriptions = tool_descriptions + [f'"{tool}": {f_doc.strip()}\nargs json schema:\n{tool_schema(f)}\n']
+        else:
+            tool_descriptions = tool_descriptions + [f'"{tool}": {f_doc.strip()}\n']
     return numbered_list(tool_descriptions)
 
 
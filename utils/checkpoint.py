@@ -0,0 +1,36 @@
+import json
+import os
+from typing import Dict, Optional
+
+from lib import logger
+
+
+class AgentCheckpoint:
+    """
+    The state of an agent run after its last completed step, saved as one JSON
+    file. The file is replaced atomically so a crash while saving leaves the
+    previous checkpoint intact.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def save(self, data: Dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(data, f, default=str)
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> Optional[Dict]:
+        if not self.exists():
+            return None
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return None
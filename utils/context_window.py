@@ -0,0 +1,152 @@
+from dataclasses import dataclass
+from typing import Dict, List, Literal
+
+from llms.token_counter import count_message_tokens, count_tokens
+
+TrimPolicy = Literal["none", "truncate", "drop"]
+
+TRUNCATION_MARKER = "\n[... {tokens} tokens of this observation were trimmed to fit the context window]"
+# leaves room for the tokenizer being an estimate for Anthropic models
+DEFAULT_HEADROOM = 0.95
+DROPPED_TURNS_NOTE = "## Note\n{turns} earlier tool calls and their observations were removed to fit the context window."
+
+
+def prefix_length(messages: List[Dict]) -> int:
+    """System messages plus the first user message (the task instructions)."""
+    index = 0
+    while index < len(messages) and messages[index].get("role") == "system":
+        index += 1
+    return min(index + 1, len(messages))
+
+
+def old_turns(
+    messages: List[Dict], start: int, keep_recent_turns: int
+) -> List[List[int]]:
+    """
+    Message indices of each turn (an assistant message and the messages following
+    it) after `start`, oldest first, leaving out the `keep_recent_turns` latest.
+    """
+    turns: List[List[int]] = []
+    for index in range(start, len(messages)):
+        if messages[index].get("role") == "assistant" or not turns:
+            turns.append([])
+        turns[-1].append(index)
+    if turns and messages[turns[0][0]].get("role") != "assistant":
+        # a dropped-turns note or other leading user messages; keep them
+        turns.pop(0)
+    return turns[: max(0, len(turns) - keep_recent_turns)]
+
+
+@dataclass
+class TrimResult:
+    tokens_before: int
+    tokens_after: int
+    truncated_messages: int = 0
+    dropped_turns: int = 0
+
+    @property
+    def trimmed(self) -> bool:
+        return bool(self.truncated_messages or self.dropped_turns)
+
+
+class ContextWindow:
+    """
+    Keeps an agent conversation under the model's input limit. The leading
+    system/instruction messages and the last `keep_recent_turns` turns (an
+    assistant message and the messages that follow it) are never touched. Older
+    turns are trimmed oldest first according to `policy`:
+
+        - "truncate": long old observations are cut to `truncated_observation_tokens`,
+          and whole turns are dropped only if that is not enough.
+        - "drop": old turns are removed whole and replaced by a one-line note.
+        - "none": messages are sent as they are.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_input_tokens: int,
+        policy: TrimPolicy = "truncate",
+        keep_recent_turns: int = 3,
+        truncated_observation_tokens: int = 500,
+    ):
+        self.model_name = model_name
+        self.max_input_tokens = max_input_tokens
+        self.policy = policy
+        self.keep_recent_turns = keep_recent_turns
+        self.truncated_observation_tokens = truncated_observation_tokens
+
+    def count(self, messages: List[Dict]) -> int:
+        return count_message_tokens(messages, self.model_name)
+
+    def _truncate(self, message: Dict) -> bool:
+        content = message.get("content")
+        if (
+            not isinstance(content, str)
+            or not content.startswith("## Observation")
+            or content.endswith(TRUNCATION_MARKER[-27:])
+        ):
+            return False
+        tokens = count_tokens(content, self.model_name)
+        if tokens <= self.truncated_observation_tokens:
+            return False
+        # cut by characters in proportion; exact enough for a budget
+        keep_chars = len(content) * self.truncated_observation_tokens // tokens
+        message["content"] = content[:keep_chars] + TRUNCATION_MARKER.format(
+            tokens=tokens - self.truncated_observation_tokens
+        )
+        return True
+
+    def fit(self, messages: List[Dict]) -> TrimResult:
+        """
+        Trims `messages` in place so they fit in `max_input_tokens`. Editing the
+        history in place (rather than a per-request copy) keeps it stable between
+        turns, so the provider's prompt cache only misses when a trim happens.
+        """
+        tokens = self.count(messages)
+        result = TrimResult(tokens_before=tokens, tokens_after=tokens)
+        if self.policy == "none" or tokens <= self.max_input_tokens:
+            return result
+
+        prefix = prefix_length(messages)
+        if self.policy == "truncate":
+            for turn in old_turns(messages, prefix, self.keep_recent_turns):
+                for index in turn:
+                    if self._truncate(messages[index]):
+                        result.truncated_messages += 1
+                if self.count(messages) <= self.max_input_tokens:
+                    break
+
+        tokens = self.count(messages)
+        if tokens > self.max_input_tokens:
+            dropped = set()
+            for turn in old_turns(messages, prefix, self.keep_recent_turns):
+                if tokens <= self.max_input_tokens:
+                    break
+                tokens -= count_message_tokens(
+                    [messages[index] for index in turn], self.model_name
+                )
+                dropped.update(turn)
+                result.dropped_turns += 1
+            if dropped:
+                self._drop(messages, prefix, dropped, result.dropped_turns)
+
+        result.tokens_after = self.count(messages)
+        return result
+
+    @staticmethod
+    def _drop(messages: List[Dict], prefix: int, dropped: set, turns: int):
+        note_prefix = DROPPED_TURNS_NOTE.split("{turns}")[0]
+        has_note = prefix < len(messages) and str(
+            messages[prefix].get("content", "")
+        ).startswith(note_prefix)
+        if has_note:
+            previous = int(messages[prefix]["content"][len(note_prefix) :].split()[0])
+            turns += previous
+        kept = [
+            message
+            for index, message in enumerate(messages)
+            if index >= prefix + has_note and index not in dropped
+        ]
+        note = {"role": "user", "content": DROPPED_TURNS_NOTE.format(turns=turns)}
+        messages[prefix:] = [note] + kept
@@ -0,0 +1,196 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from llms.token_counter import count_tokens
+from utils.context_window import old_turns, prefix_length
+
+COMPACTED_HEADER = "## Observation (compacted)"
+MAX_SYMBOLS = 20
+MAX_EXCERPT_CHARS = 300
+
+FILE_HEADER_PATTERN = re.compile(
+    r"\[File: (?P<path>.+?) \((?P<total>\d+) lines total\)\]"
+)
+NUMBERED_LINE_PATTERN = re.compile(r"^(\d+):", re.MULTILINE)
+# headings of the observations of a `tool_calls` batch (see BaseAgent.run_tools)
+BATCH_OBSERVATION_PATTERN = re.compile(r"^## Observation \d+/\d+: .*$", re.MULTILINE)
+SYMBOL_PATTERN = re.compile(
+    r"^(?:\d+:)?\s*(?:async\s+)?(?P<kind>class|def)\s+(?P<name>\w+)", re.MULTILINE
+)
+
+
+@dataclass
+class CompactionStats:
+    turns_compacted: int = 0
+    observation_tokens_before: int = 0
+    observation_tokens_after: int = 0
+    # summed over every request sent after a compaction
+    prompt_tokens_saved: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.observation_tokens_before - self.observation_tokens_after
+
+    @property
+    def ratio(self) -> float:
+        """Size of the compacted observations relative to the originals."""
+        if not self.observation_tokens_before:
+            return 1.0
+        return self.observation_tokens_after / self.observation_tokens_before
+
+
+class ConversationCompactor:
+    """
+    Replaces the observations of old agent turns with short digests: the tool
+    call, its status, the file path and line range read and the classes and
+    functions seen. The last `keep_recent_turns` turns stay verbatim. Old turns
+    are compacted `batch_size` at a time so the conversation prefix (and with it
+    the provider's prompt cache) only changes every few turns, not every turn.
+    """
+
+    def __init__(
+        self, model_name: str = "", keep_recent_turns: int = 3, batch_size: int = 4
+    ):
+        self.model_name = model_name
+        self.keep_recent_turns = keep_recent_turns
+        self.batch_size = batch_size
+        self.stats = CompactionStats()
+        # ids of the assistant messages of turns already looked at
+        self._examined = set()
+
+    def reset(self):
+        self.stats = CompactionStats()
+        self._examined = set()
+
+    @staticmethod
+    def _tool_calls(message: Dict) -> List[Optional[Dict]]:
+        """The tool calls of an assistant response, one per observation it produced."""
+        content = message.get("content")
+        if not isinstance(content, str):
+            return [None]
+        start, end = content.find("{"), content.rfind("}")
+        try:
+            response = json.loads(content[start : end + 1])
+        except json.JSONDecodeError:
+            return [None]
+        if not isinstance(response, dict):
+            return [None]
+        if isinstance(response.get("tool_calls"), list) and response["tool_calls"]:
+            return [
+                call if isinstance(call, dict) else None
+                for call in response["tool_calls"]
+            ]
+        return [response]
+
+    def _digest_observations(
+        self, observation: str, tool_calls: List[Optional[Dict]]
+    ) -> str:
+        headings = list(BATCH_OBSERVATION_PATTERN.finditer(observation))
+        if not headings:
+            return self.digest(observation, tool_calls[0])
+        digests = []
+        for index, heading in enumerate(headings):
+            end = (
+                headings[index + 1].start()
+                if index + 1 < len(headings)
+                else len(observation)
+            )
+            section = observation[heading.end() : end]
+            tool_call = tool_calls[index] if index < len(tool_calls) else None
+            digests.append(self.digest(section, tool_call))
+        return "\n\n".join(digests)
+
+    @staticmethod
+    def digest(observation: str, tool_call: Optional[Dict] = None) -> str:
+        lines = [COMPACTED_HEADER]
+        tool_args = {}
+        if tool_call:
+            tool_args = tool_call.get("tool_args") or {}
+            lines.append(
+                f"Tool: {tool_call.get('tool')} {json.dumps(tool_args, default=str)}"
+            )
+        status = re.search(r"^Status: (\w+)", observation, re.MULTILINE)
+        if status:
+            lines.append(f"Status: {status.group(1)}")
+
+        file_header = FILE_HEADER_PATTERN.search(observation)
+        line_numbers = [int(n) for n in NUMBERED_LINE_PATTERN.findall(observation)]
+        if file_header:
+            path = file_header.group("path")
+        elif isinstance(tool_args, dict):
+            path = tool_args.get("file_path")
+        else:
+            path = None
+        if path:
+            file_line = f"File: {path}"
+            if line_numbers:
+                file_line += f", lines {min(line_numbers)}-{max(line_numbers)}"
+            if file_header:
+                file_line += f" of {file_header.group('total')}"
+            lines.append(file_line)
+
+        symbols = list(
+            dict.fromkeys(
+                f"{match.group('kind')} {match.group('name')}"
+                for match in SYMBOL_PATTERN.finditer(observation)
+            )
+        )
+        if symbols:
+            more = len(symbols) - MAX_SYMBOLS
+            lines.append(
+                "Symbols: "
+                + ", ".join(symbols[:MAX_SYMBOLS])
+                + (f" (+{more} more)" if more > 0 else "")
+            )
+        if not path and not symbols:
+            response = observation.split("Response:", 1)[-1].strip()
+            excerpt = response[:MAX_EXCERPT_CHARS]
+            ellipsis = " ..." if len(response) > len(excerpt) else ""
+            lines.append(f"Excerpt: {excerpt}{ellipsis}")
+        lines.append(
+            "[Full output removed to save context; run the tool again if needed]"
+        )
+        return "\n".join(lines)
+
+    def compact(self, messages: List[Dict]) -> int:
+        """
+        Compacts old observations of `messages` in place and returns how many turns
+        were compacted by this call.
+        """
+        turns = [
+            turn
+            for turn in old_turns(
+                messages, prefix_length(messages), self.keep_recent_turns
+            )
+            if id(messages[turn[0]]) not in self._examined
+        ]
+        compacted = 0
+        if len(turns) >= self.batch_size:
+            for turn in turns:
+                compacted += self._compact_turn(messages, turn)
+        self.stats.prompt_tokens_saved += self.stats.tokens_saved
+        return compacted
+
+    def _compact_turn(self, messages: List[Dict], turn: List[int]) -> bool:
+        self._examined.add(id(messages[turn[0]]))
+        tool_calls = self._tool_calls(messages[turn[0]])
+        compacted = False
+        for index in turn[1:]:
+            content = messages[index].get("content")
+            if not isinstance(content, str) or not content.startswith(
+                "## Observation"
+            ):
+                continue
+            digest = self._digest_observations(content, tool_calls)
+            before = count_tokens(content, self.model_name)
+            after = count_tokens(digest, self.model_name)
+            if after >= before:
+                continue
+            messages[index]["content"] = digest
+            self.stats.observation_tokens_before += before
+            self.stats.observation_tokens_after += after
+            compacted = True
+        self.stats.turns_compacted += compacted
+        return compacted
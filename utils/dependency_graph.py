@@ -14,6 +14,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), ".."))
 from lib import logger
 from config import console
 from tools import LSPRequestTypes, LSPUtils, LSPSupportedLanguages
+from utils.import_graph import build_repo_graph
 
 
 lsp_tool = LSPUtils(
@@ -95,12 +96,20 @@ def categorize_import(
     repo_modules: Dict[str, List[str]],
     python_packages: Dict[str, List[str]],
     root_path: Optional[str] = None,
+    level: int = 0,
 ):
     # check if module name has 'as' in it
     module_name_without_as = module_name.split(" as ")[0]
-    if is_repo_module(module_name_without_as, current_file_path, root_path):
+    # relative imports always point inside the repo
+    if level > 0 or is_repo_module(
+        module_name_without_as, current_file_path, root_path
+    ):
         if module_name not in repo_modules:
-            repo_modules[module_name] = {"imports": [], "line_no": line_no}
+            repo_modules[module_name] = {
+                "imports": [],
+                "line_no": line_no,
+                "level": level,
+            }
         if imports:
             repo_modules[module_name]["imports"].extend(imports)
     else:
@@ -139,7 +148,8 @@ def get_imports(path: str, root_path: Optional[str] = None):
                     root_path=root_path,
                 )
         elif isinstance(node, ast.ImportFrom):
-            module_name = node.module
+            # relative imports are keyed with their leading dots, e.g. `..utils`
+            module_name = "." * node.level + (node.module or "")
             if module_name:
                 imports = [(alias.name, alias.asname) for alias in node.names]
                 # logger.debug(
@@ -153,70 +163,67 @@ def get_imports(path: str, root_path: Optional[str] = None):
                     repo_modules=repo_modules,
                     python_packages=python_packages,
                     root_path=root_path,
+                    level=node.level,
                 )
 
     return repo_modules, python_packages
 
 
+def _lsp_resolve_import(
+    file_path: str, lines: List[str], module_name: str, line_no: int
+) -> Optional[str]:
+    # TODO: Extend to handle other languages as well
+    lsp_tool.file_path = file_path
+    lsp_tool.language = LSPSupportedLanguages.PYTHON
+    lsp_tool.line_number = line_no
+    lsp_tool.symbol = None
+    module_import_line = lines[line_no - 1]
+    # get the starting index of the module_name
+    module_name_starting_index = module_import_line.index(module_name)
+    # we are interested in the idx number of the last "." in the module_name
+    if "." in module_name:
+        lsp_tool.column_number = module_name_starting_index + module_name.rindex(".") + 1
+    else:
+        lsp_tool.column_number = module_name_starting_index
+
+    lsp_tool.request_type = LSPRequestTypes.DEFINITION
+    lsp_result = lsp_tool.run()
+    # logger.info(
+    #     f"[bold gray10]FETCH DEFINITION[/]: {module_name} ; LSP Result: {lsp_result['success']}"
+    # )
+    if lsp_result["success"] and lsp_result["response"]:
+        return lsp_result["response"][0]["absolutePath"]
+    return None
+
+
 def build_call_graph(entry_point: str, base_path: str) -> nx.DiGraph:
-    G = nx.DiGraph()
-    visited = set()
+    """
+    Builds the import graph reachable from `entry_point`, as a subgraph of the
+    cached repo graph from `build_repo_graph`. Imports are resolved statically
+    with `ModuleResolver`; the language server is only asked for the ones it
+    cannot resolve. The number of imports resolved by each path (over the whole
+    repo) is stored in `G.graph["import_resolution"]`.
+    """
     # make sure base path is an absolute path
     base_path = os.path.abspath(base_path)
-
-    def process_file(file_path: str, level=0):
-        if file_path in visited:
-            return
-
-        visited.add(file_path)
-        relative_path = os.path.relpath(file_path, base_path)
-        G.add_node(relative_path)
-
-        repo_modules, _ = get_imports(file_path, base_path)
-        # if repo_modules:
-        #     logger.info(f"[bold green] PROCESSING: [/] {file_path} // {base_path}")
-        if not repo_modules:
-            logger.info(f"[bold red] NO MODULES: [/] {file_path} // {base_path}")
-        for module_name, import_dict in repo_modules.items():
-            # TODO: Extend to handle other languages as well
-            lsp_tool.file_path = file_path
-            lsp_tool.language = LSPSupportedLanguages.PYTHON
-            lsp_tool.line_number = import_dict["line_no"]
-            lsp_tool.symbol = None
-            with open(file_path, "r") as f:
-                lines = f.readlines()
-                module_import_line = lines[lsp_tool.line_number - 1]
-                # get the starting index of the module_name
-                module_name_starting_index = module_import_line.index(module_name)
-                # we are interested in the idx number of the last "." in the module_name
-                if "." in module_name:
-                    lsp_tool.column_number = (
-                        module_name_starting_index + module_name.rindex(".") + 1
-                    )
-                else:
-                    lsp_tool.column_number = module_name_starting_index
-
-            lsp_tool.request_type = LSPRequestTypes.DEFINITION
-            lsp_result = lsp_tool.run()
-            # logger.info(
-            #     f"[bold gray10]FETCH DEFINITION[/]: {module_name} ; Level ({level}); LSP Result: {lsp_result['success']}"
-            # )
-            if lsp_result["success"]:
-                node = os.path.relpath(
-                    lsp_result["response"][0]["absolutePath"], base_path
-                )
-                G.add_node(node)
-                G.add_edge(
-                    relative_path,
-                    node,
-                    imports=import_dict["imports"],
-                )
-                logger.info(
-                    f"EDGE: {relative_path} -> {node} [{import_dict['imports']}]"
-                )
-                process_file(lsp_result["response"][0]["absolutePath"], level=level + 1)
-
-    process_file(os.path.abspath(entry_point))
+    lsp_tool.repo_path = base_path
+
+    def lsp_fallback(file_path: str, import_info: Dict) -> Optional[str]:
+        with open(file_path, "r") as f:
+            lines = f.readlines()
+        # relative imports are looked up with their leading dots, e.g. `..utils`
+        module_name = "." * import_info["level"] + import_info["module"]
+        return _lsp_resolve_import(
+            file_path, lines, module_name, import_info["line_no"]
+        )
+
+    repo_graph = build_repo_graph(base_path=base_path, fallback=lsp_fallback)
+    entry_node = os.path.relpath(os.path.abspath(entry_point), base_path)
+    nodes = {entry_node}
+    if entry_node in repo_graph:
+        nodes |= nx.descendants(repo_graph, entry_node)
+    G = repo_graph.subgraph(nodes).copy()
+    G.add_node(entry_node)
     return G
 
 
@@ -276,13 +283,12 @@ if __name__ == "__main__":
     # navigate_dependencies()
     entry_point = "main.py"
     base_path = os.path.abspath(".")
-    G = build_call_graph(entry_point=entry_point, base_path=base_path)
+    # The repo graph is cached per file under saved_states/call_graphs/<repo>;
+    # re-runs only re-parse files whose content changed
+    G = build_call_graph(entry_point, base_path)
     console.print(G.nodes())
     # visualize_graph_plotly(G)
 
-    # os.makedirs(
-    #     f"saved_states/call_graphs/{entry_point.split('/', -1)[0]}", exist_ok=True
-    # )
     with open(f"saved_states/call_graphs/ex_main_py.gpickle", "wb") as f:
         pickle.dump(G, f, pickle.HIGHEST_PROTOCOL)
 
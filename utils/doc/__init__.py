@@ -1,22 +1,77 @@
 import json
 import os
-from .doc_model import Doc, find_doc
+from typing import Optional
+
+from config import config
+from llms import OpenAiLLM, OpenAiChatModels, AnthropicLLM, AnthropicModels
+from llms.base_llm import BaseLLM
+from .doc_model import Doc, LazyDoc, find_doc
 from .doc_generation import DocUtils
+from .doc_store import DocStore, DocChanges
 
 
-def get_doc(repo_path: str) -> Doc:
-    doc_index_path = f"saved_states/indices/{repo_path}/default.json"
-    if not os.path.exists(doc_index_path):
-        doc_utils = DocUtils(
-            path=repo_path,
-            gitignore_path=f"{repo_path}/.gitignore",
+def get_doc_llm() -> Optional[BaseLLM]:
+    """Returns the model configured by `config.doc_model`, or None if it is unset."""
+    if not config.doc_model:
+        return None
+    if config.doc_model in {model.value for model in OpenAiChatModels}:
+        return OpenAiLLM(
+            model=OpenAiChatModels(config.doc_model),
+            config=config,
+            title="Documentation",
+        )
+    if config.doc_model in {model.value for model in AnthropicModels}:
+        return AnthropicLLM(
+            model=AnthropicModels(config.doc_model),
+            config=config,
+            title="Documentation",
         )
+    raise ValueError(f"Unknown documentation model: {config.doc_model}")
+
+
+def get_doc(repo_path: str, lazy: Optional[bool] = None) -> Doc:
+    """
+    Returns the documentation tree of `repo_path`, building it on first use and
+    refreshing it against the working tree afterwards. With `lazy` (default:
+    `config.lazy_doc_index`) a stored index is returned as a `LazyDoc` whose
+    children and text are loaded from the store on first access.
+    """
+    lazy = config.lazy_doc_index if lazy is None else lazy
+    index_dir = f"saved_states/indices/{repo_path}"
+    # indices saved before the sqlite store was introduced are migrated once
+    legacy_index_path = os.path.join(index_dir, "default.json")
+    doc_store = DocStore(os.path.join(index_dir, "index.db"))
+    doc_utils = DocUtils(
+        path=repo_path,
+        gitignore_path=f"{repo_path}/.gitignore",
+        llm=get_doc_llm(),
+        doc_cache=doc_store,
+    )
+
+    if doc_store.is_empty() and not os.path.exists(legacy_index_path):
         doc_utils.generate_documentation(doc_utils.root_doc)
         root_doc = doc_utils.root_doc
-        if not os.path.exists(f"saved_states/indices/{repo_path}"):
-            os.makedirs(f"saved_states/indices/{repo_path}")
-        with open(doc_index_path, "w") as f:
-            f.write(json.dumps(root_doc.get_dict(), indent=4))
+        root_doc.build_path_index()
+        doc_store.save_tree(root_doc)
+        return root_doc
+
+    if lazy and not doc_store.is_empty():
+        # Refresh against the stored fingerprints, then hand out a tree that loads
+        # only what is accessed; its path index fills in as lookups descend
+        changes = DocChanges()
+        doc_utils.refresh_stored_documentation(doc_store, changes=changes)
+        doc_store.apply_changes(changes)
+        return doc_store.load_lazy_tree()
+
+    if doc_store.is_empty():
+        root_doc = Doc(**json.loads(open(legacy_index_path).read()))
+        doc_store.save_tree(root_doc)
     else:
-        root_doc = Doc(**json.loads(open(doc_index_path).read()))
+        root_doc = doc_store.load_tree()
+    root_doc.build_path_index()
+
+    # Re-index only what changed in the working tree since the index was saved
+    changes = DocChanges()
+    doc_utils.refresh_documentation(root_doc, changes=changes)
+    doc_store.apply_changes(changes)
     return root_doc
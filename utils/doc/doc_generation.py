@@ -1,12 +1,23 @@
 import os
+import codecs
+import hashlib
+import threading
 import concurrent.futures
-from gitignore_parser import parse_gitignore
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple, Union
 from rich.console import Console
 
-from utils.doc.doc_model import Doc
+from utils.doc.doc_model import Doc, find_doc
+from utils.doc.doc_store import DocChanges, DocStore
+from utils.gitignore import GitIgnoreMatcher
+from llms import (
+    OpenAiLLM,
+    OpenAIDecodingArguments,
+    AnthropicLLM,
+    AnthropicDecodingArguments,
+)
+from llms.base_llm import BaseLLM
 from lib import logger
-from config import console
+from config import console, config
 
 
 def read_file(file_name):
@@ -18,8 +29,68 @@ def read_file(file_name):
         raise Exception(e)
 
 
+def read_file_with_fingerprint(file_name) -> Tuple[str, os.stat_result, str]:
+    """Reads a file and returns its text, stat result and content hash."""
+    with open(file_name, "rb") as file:
+        stat = os.fstat(file.fileno())
+        content = file.read()
+    # the file already passed `sniff_file`, so stray bytes past the sniffed prefix
+    # are replaced rather than dropping the whole file
+    text = content.decode("utf-8", errors="replace")
+    return text, stat, hashlib.sha1(content).hexdigest()
+
+
+SNIFF_SIZE = 8192
+# (device, inode, mtime_ns, size) -> "text" | "binary" | "undecodable"
+_sniff_cache: Dict[Tuple[int, int, int, int], str] = {}
+
+
+def sniff_file(file_name: str, stat: Optional[os.stat_result] = None) -> str:
+    """
+    Classifies a file as "text", "binary" (contains NUL bytes) or "undecodable"
+    (not utf-8) by reading only its first SNIFF_SIZE bytes. Results are cached per
+    inode and invalidated when the file's mtime or size changes.
+    """
+    stat = stat or os.stat(file_name)
+    key = (stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    if key in _sniff_cache:
+        return _sniff_cache[key]
+
+    with open(file_name, "rb") as file:
+        prefix = file.read(SNIFF_SIZE)
+    if b"\0" in prefix:
+        result = "binary"
+    else:
+        try:
+            # final=False tolerates a multi-byte character cut off by the prefix
+            codecs.getincrementaldecoder("utf-8")().decode(prefix, final=False)
+            result = "text"
+        except UnicodeDecodeError:
+            result = "undecodable"
+    _sniff_cache[key] = result
+    return result
+
+
 class DocUtils:
-    def __init__(self, path: str, gitignore_path: str = None, use_default_gitignore: bool = True):
+    def __init__(
+        self,
+        path: str,
+        gitignore_path: str = None,
+        use_default_gitignore: bool = True,
+        llm: Optional[BaseLLM] = None,
+        decoding_args: Optional[
+            Union[OpenAIDecodingArguments, AnthropicDecodingArguments]
+        ] = None,
+        doc_cache: Optional[DocStore] = None,
+        max_concurrent_requests: Optional[int] = None,
+    ):
+        """
+        Without `llm` docs are created with empty text, which is enough for the
+        file tree. `doc_cache` stores generated text by content so unchanged files
+        and folders are never sent to the model twice, and at most
+        `max_concurrent_requests` (default: `config.doc_max_concurrency`) model
+        calls are in flight at once, whatever the size of the worker pool.
+        """
         self.documentation_file_level_system_prompt = "documentation_system_prompt.txt"
         self.documentation_file_level_user_prompt = "documentation_user_prompt.txt"
 
@@ -33,136 +104,571 @@ class DocUtils:
         self.root_doc = Doc(
             path=path, parent=None, children=[], documentation="", summary=""
         )
-        if gitignore_path and os.path.exists(gitignore_path):
-            self.matches = parse_gitignore(gitignore_path)
-        elif use_default_gitignore:
-            self.matches = parse_gitignore("workspace/.gitignore")
-        else:
-            self.matches = lambda x: False
+        # the repo's own .gitignore files and .git/info/exclude are always read;
+        # `gitignore_path` only adds an ignore file from outside that set
+        extra_ignore_files = []
+        if (
+            gitignore_path
+            and os.path.exists(gitignore_path)
+            and os.path.abspath(gitignore_path)
+            != os.path.abspath(os.path.join(path, ".gitignore"))
+        ):
+            extra_ignore_files.append(gitignore_path)
+        self.matches = GitIgnoreMatcher(
+            path,
+            extra_ignore_files=extra_ignore_files,
+            use_default_patterns=use_default_gitignore,
+        )
 
+        self.llm = llm
+        if decoding_args is None and isinstance(llm, OpenAiLLM):
+            decoding_args = OpenAIDecodingArguments(temperature=0.2, max_tokens=1024)
+        elif decoding_args is None and isinstance(llm, AnthropicLLM):
+            decoding_args = AnthropicDecodingArguments(temperature=0.2, max_tokens=1024)
+        self.decoding_args = decoding_args
+        self.doc_cache = doc_cache
+        self._llm_slots = threading.BoundedSemaphore(
+            max_concurrent_requests or config.doc_max_concurrency
+        )
+        self._prompts: Dict[str, str] = {}
+
+        self.max_workers = min(32, (os.cpu_count() or 1) * 4)
         self.ignore_file_types = [".png", ".pdf", ".ico", ".jpg", ".jpeg", ".pfb", ".ttf", ".tif", ".dvi", ".npz", ".db"]
 
     def _list_files_and_folders(self, filepath):
 
         files = []
         folders = []
-        for element in os.listdir(filepath):
-            element_starts_with_dot = element.startswith(".")
-            element_in_gitignore = self.matches(os.path.join(filepath, element))
-            element_ends_with_ignore_file_types = element.endswith(tuple(self.ignore_file_types))
-
-            if element_starts_with_dot or element_in_gitignore or element_ends_with_ignore_file_types:
-                logger.warning(
-                    f"[bold red]Ignoring[/bold red]: [File: ({os.path.join(filepath, element)})]."
-                )
-                continue
-            if os.path.isfile(os.path.join(filepath, element)):
-                try:
-                    read_file(os.path.join(filepath, element))
-                except Exception as e:
-                    ext = os.path.splitext(element)[1]
-                    self.ignore_file_types.append(ext)
+        # scandir entries carry the file type from the directory listing and cache
+        # their stat result, so no extra isfile / isdir syscalls are needed
+        with os.scandir(filepath) as entries:
+            for entry in entries:
+                element = entry.name
+                element_starts_with_dot = element.startswith(".")
+                # ignored folders are never listed, so nothing below them is visited
+                element_in_gitignore = self.matches(entry.path, is_dir=entry.is_dir())
+                element_ends_with_ignore_file_types = element.endswith(tuple(self.ignore_file_types))
+
+                if element_starts_with_dot or element_in_gitignore or element_ends_with_ignore_file_types:
                     logger.warning(
-                        f"[bold red]Ignoring[/bold red]: [File: ({os.path.join(filepath, element)})]. Adding {ext} to ignore list"
+                        f"[bold red]Ignoring[/bold red]: [File: ({entry.path})]."
                     )
                     continue
-                files.append(os.path.join(filepath, element))
-            elif os.path.isdir(os.path.join(filepath, element)):
-                folders.append(os.path.join(filepath, element))
-        return files, folders
+                if entry.is_file():
+                    try:
+                        file_type = sniff_file(entry.path, entry.stat())
+                    except OSError:
+                        file_type = "undecodable"
+                    if file_type == "binary":
+                        # NUL bytes mean a binary format; skip the whole extension from now on
+                        ext = os.path.splitext(element)[1]
+                        if ext:
+                            self.ignore_file_types.append(ext)
+                        logger.warning(
+                            f"[bold red]Ignoring[/bold red]: [File: ({entry.path})]. Adding {ext} to ignore list"
+                        )
+                        continue
+                    if file_type == "undecodable":
+                        logger.warning(
+                            f"[bold red]Ignoring[/bold red]: [File: ({entry.path})]. Not a utf-8 text file"
+                        )
+                        continue
+                    files.append(entry.path)
+                elif entry.is_dir():
+                    folders.append(entry.path)
+        # scandir order is arbitrary; sorted lists give every folder the same child
+        # order as a tree reloaded from the DocStore (see CHILD_ORDER)
+        return sorted(files), sorted(folders)
 
     def _extract_documentation(self, text):
-        # FIXME: Hack to skip documentation. Remove this.
         if not text:
             return ""
-        return text.split("# Documentation")[1].split("# Summary")[0].strip()
+        if "# Documentation" not in text:
+            # the model ignored the format; keep whatever it wrote
+            return text.split("# Summary")[0].strip()
+        return text.split("# Documentation", 1)[1].split("# Summary")[0].strip()
 
     def _extract_summary(self, text):
-        # FIXME: Hack to skip summary. Remove this.
-        if not text:
+        if not text or "# Summary" not in text:
             return ""
-        return text.split("# Summary")[1].strip()
+        return text.split("# Summary", 1)[1].strip()
+
+    def _document(
+        self, cache_key: str, system_prompt_file: str, user_prompt: str
+    ) -> Tuple[str, str]:
+        """Returns (documentation, summary) from the cache or, failing that, the model."""
+        if self.doc_cache is not None:
+            cached = self.doc_cache.get_cached_doc(cache_key, self.llm.model_name)
+            if cached:
+                return cached
+
+        messages = [
+            {"role": "system", "content": self.get_prompt(system_prompt_file)},
+            {"role": "user", "content": user_prompt},
+        ]
+        with self._llm_slots:
+            response = self.llm.chat(
+                messages=messages, decoding_args=self.decoding_args
+            )
+        documentation = self._extract_documentation(response["content"])
+        summary = self._extract_summary(response["content"])
+
+        if self.doc_cache is not None:
+            self.doc_cache.cache_doc(
+                cache_key, self.llm.model_name, documentation, summary
+            )
+        return documentation, summary
 
     def _generate_documentation_for_folder(
-            self, folder_path: str, documentations: list
-    ):
-        # generate documentation for the folder
-        logger.debug("Generating documentation for folder:", folder_path)
-        # system_prompt = self.get_prompt(self.documentation_folder_level_system_prompt)
-        # user_prompt = self.get_prompt(self.documentation_folder_level_user_prompt)
-        # user_prompt = user_prompt.format(
-        #     folder_path=folder_path, documentation="\n".join(documentations)
-        # )
-
-        # FIXME: Temporarily disabling the model
-        # response = self.model.chat_completion(
-        #     [
-        #         {"role": "system", "content": system_prompt},
-        #         {"role": "user", "content": user_prompt},
-        #     ]
-        # )
-        # return response, folder_path
-        return None, folder_path
-
-    def _generate_documentation_for_file(self, code, filename):
+        self, folder_path: str, documentations: list
+    ) -> Tuple[str, str]:
+        if self.llm is None:
+            return "", ""
+        logger.debug(f"Generating documentation for folder: {folder_path}")
+        documentation = "\n".join(documentations)
+        user_prompt = self.get_prompt(
+            self.documentation_folder_level_user_prompt
+        ).format(folder_path=folder_path, documentation=documentation)
+        # a folder only needs new docs when the docs of its children change
+        children_hash = hashlib.sha1(documentation.encode()).hexdigest()
+        return self._document(
+            f"folder:{folder_path}:{children_hash}",
+            self.documentation_folder_level_system_prompt,
+            user_prompt,
+        )
+
+    def _generate_documentation_for_file(
+        self, code: str, filename: str, content_hash: str
+    ) -> Tuple[str, str]:
         if not filename.endswith((".py", ".sh", ".css", ".html", ".js", ".txt", ".md")):
-            return (
-                f"# Documentation {filename} - Asset File # Summary {filename} - Asset File",
-                filename,
-            )
-        logger.debug("Generating documentation for file:", filename)
-        # system_prompt = self.get_prompt(self.documentation_file_level_system_prompt)
-        # user_prompt = self.get_prompt(self.documentation_file_level_user_prompt)
-        # user_prompt = user_prompt.format(code=code, filename=filename)
-
-        # FIXME: Temporarily disabling the model
-        # response = self.model.chat_completion(
-        #     [
-        #         {"role": "system", "content": system_prompt},
-        #         {"role": "user", "content": user_prompt},
-        #     ]
-        # )
-        # return response, filename
-        return None, filename
-
-    def generate_documentation(self, parent_node):
-        files, folders = self._list_files_and_folders(parent_node.path)
+            return f"{filename} - Asset File", f"{filename} - Asset File"
+        if self.llm is None:
+            return "", ""
+        logger.debug(f"Generating documentation for file: {filename}")
+        user_prompt = self.get_prompt(self.documentation_file_level_user_prompt).format(
+            code=code, filename=filename
+        )
+        return self._document(
+            f"file:{filename}:{content_hash}",
+            self.documentation_file_level_system_prompt,
+            user_prompt,
+        )
+
+    def _generate_file_doc(
+        self, file: str, prefetched: Optional[Tuple[str, os.stat_result, str]] = None
+    ) -> Doc:
+        code, stat, content_hash = prefetched or read_file_with_fingerprint(file)
+        documentation, summary = self._generate_documentation_for_file(
+            code, file, content_hash
+        )
+        return Doc(
+            path=file,
+            children=[],
+            documentation=documentation,
+            summary=summary,
+            mtime=stat.st_mtime,
+            size=stat.st_size,
+            content_hash=content_hash,
+        )
 
+    def _generate_file_docs(
+        self,
+        files: List[str],
+        prefetched: Optional[Dict[str, Tuple[str, os.stat_result, str]]] = None,
+        executor: Optional[concurrent.futures.Executor] = None,
+    ) -> Dict[str, Doc]:
+        if executor is None:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers
+            ) as executor:
+                return self._generate_file_docs(files, prefetched, executor)
+
+        docs = {}
+        prefetched = prefetched or {}
         # generate the documentation for the files parallely
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            future_to_file = {
-                executor.submit(
-                    self._generate_documentation_for_file, read_file(file), file
-                ): file
-                for file in files
-            }
-            for future in concurrent.futures.as_completed(future_to_file):
-                file = future_to_file[future]
+        future_to_file = {
+            executor.submit(self._generate_file_doc, file, prefetched.get(file)): file
+            for file in files
+        }
+        for future in concurrent.futures.as_completed(future_to_file):
+            try:
+                docs[future_to_file[future]] = future.result()
+            except Exception as exc:
+                console.print_exception(show_locals=True)
+        return docs
+
+    def _document_folder(self, folder_node: Doc):
+        # summaries keep the folder prompt small however large the folder is
+        children_documentation = [
+            f"## {child.path}\n{child.summary or child.documentation}"
+            for child in folder_node.children
+        ]
+        folder_node.documentation, folder_node.summary = (
+            self._generate_documentation_for_folder(
+                folder_node.path, children_documentation
+            )
+        )
+
+    def _walk(
+        self, parent_node: Doc, executor: concurrent.futures.Executor
+    ) -> Tuple[List[Doc], List[Tuple[Doc, str]]]:
+        """
+        Scans the tree under `parent_node` with every directory listing running as
+        its own task on `executor`. Folder docs are attached as they are found.
+        Returns the folder docs (parents always before their children) and the
+        (folder doc, file path) pairs still to be documented.
+        """
+        folder_nodes = [parent_node]
+        files = []
+        pending = {
+            executor.submit(self._list_files_and_folders, parent_node.path): parent_node
+        }
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                node = pending.pop(future)
                 try:
-                    response, filename = future.result()
-                    documentation = self._extract_documentation(response)
-                    summary = self._extract_summary(response)
-                    parent_node.children.append(
-                        Doc(
-                            path=filename,
-                            children=[],
-                            documentation=documentation,
-                            summary=summary,
-                        )
+                    node_files, node_folders = future.result()
+                except OSError as e:
+                    logger.error(f"Failed to list directory {node.path}: {e}")
+                    continue
+                files.extend((node, file) for file in node_files)
+                for folder in node_folders:
+                    doc_for_folder = Doc(
+                        path=folder, children=[], documentation="", summary=""
                     )
+                    node.children.append(doc_for_folder)
+                    folder_nodes.append(doc_for_folder)
+                    pending[
+                        executor.submit(self._list_files_and_folders, folder)
+                    ] = doc_for_folder
+        return folder_nodes, files
+
+    def generate_documentation(
+        self, parent_node, executor: Optional[concurrent.futures.Executor] = None
+    ):
+        # One worker pool is shared by the directory walk, the file docs and the
+        # folder docs; model calls are further bounded by self._llm_slots
+        if executor is None:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.max_workers
+            ) as executor:
+                return self.generate_documentation(parent_node, executor)
+
+        folder_nodes, files = self._walk(parent_node, executor)
+
+        # a folder is documented as soon as all of its files and subfolders are,
+        # so folder docs run bottom-up alongside the remaining file docs
+        parents = {child.path: node for node in folder_nodes for child in node.children}
+        subfolders = {node.path: list(node.children) for node in folder_nodes}
+        remaining = {node.path: len(node.children) for node in folder_nodes}
+        file_docs: Dict[str, List[Doc]] = {node.path: [] for node in folder_nodes}
+        pending = {}
+        for node, file in files:
+            remaining[node.path] += 1
+            pending[executor.submit(self._generate_file_doc, file)] = (node, file)
+
+        def submit_folder(node: Doc):
+            # files first, then folders; file docs finish in any order, so they
+            # are sorted to keep the folder prompt (and its cache key) stable
+            node.children = (
+                sorted(file_docs[node.path], key=lambda doc: doc.path)
+                + subfolders[node.path]
+            )
+            pending[executor.submit(self._document_folder, node)] = (node, None)
+
+        for node in folder_nodes:
+            if remaining[node.path] == 0:
+                submit_folder(node)
+
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                node, file = pending.pop(future)
+                try:
+                    result = future.result()
                 except Exception as exc:
-                    console.print_exception(show_locals=True)
+                    target = file or node.path
+                    logger.error(
+                        f"Failed to generate documentation for {target}: {exc}"
+                    )
+                    result = None
+                if file is None:
+                    # a folder finished; it counts as a done child of its parent
+                    node = parents.get(node.path)
+                    if node is None:
+                        continue
+                elif result is not None:
+                    file_docs[node.path].append(result)
+                remaining[node.path] -= 1
+                if remaining[node.path] == 0:
+                    submit_folder(node)
+
+    def _list_tree(
+        self, path: str, executor: concurrent.futures.Executor
+    ) -> Dict[str, concurrent.futures.Future]:
+        """
+        Lists every directory under `path` in the working tree, each listing as its
+        own task on `executor`. Returns the future of each directory's listing;
+        listing errors are raised when a result is read.
+        """
+        listings = {}
+        pending = {executor.submit(self._list_files_and_folders, path): path}
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                folder = pending.pop(future)
+                listings[folder] = future
+                if future.exception() is not None:
+                    continue
+                for subfolder in future.result()[1]:
+                    pending[
+                        executor.submit(self._list_files_and_folders, subfolder)
+                    ] = subfolder
+        return listings
+
+    def refresh_documentation(
+        self,
+        root_doc: Doc,
+        parent_node: Optional[Doc] = None,
+        changes: Optional[DocChanges] = None,
+    ) -> Tuple[bool, bool]:
+        """
+        Brings the docs under `parent_node` (default: `root_doc`) in line with the
+        working tree. Files are compared by mtime and size first and by content hash
+        only when those differ; only added or modified files are re-documented,
+        deleted ones are dropped, and folder docs are regenerated only when something
+        below them changed. The path index of `root_doc` is kept up to date.
+
+        Returns (docs_changed, metadata_changed); metadata_changed means only file
+        fingerprints were updated (e.g. a touched but unmodified file). Every doc that
+        has to be written or removed is recorded in `changes`.
+        """
+        parent_node = parent_node or root_doc
+        changes = changes if changes is not None else DocChanges()
+        # as in generate_documentation, one pool serves the directory listings, the
+        # hashing of changed files and the file and folder docs of the whole refresh
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            listings = self._list_tree(parent_node.path, executor)
+            return self._refresh(root_doc, parent_node, changes, executor, listings)
+
+    def _refresh(
+        self,
+        root_doc: Doc,
+        parent_node: Doc,
+        changes: DocChanges,
+        executor: concurrent.futures.Executor,
+        listings: Dict[str, concurrent.futures.Future],
+    ) -> Tuple[bool, bool]:
+        files, folders = listings[parent_node.path].result()
+        existing = {child.path: child for child in parent_node.children}
+        docs_changed = metadata_changed = False
+
+        children = []
+        files_to_document = []
+        # files whose mtime or size changed are hashed on the pool
+        hashing = []
+        for file in files:
+            child = existing.pop(file, None)
+            if child is not None and child.content_hash is not None:
+                stat = os.stat(file)
+                if child.mtime == stat.st_mtime and child.size == stat.st_size:
+                    children.append(child)
+                    continue
+                future = executor.submit(read_file_with_fingerprint, file)
+                hashing.append((file, child, future))
+                continue
+            if child is not None:
+                root_doc.unregister_doc(child)
+                changes.delete(child.path)
+            files_to_document.append(file)
+
+        # contents read while hashing are reused for documentation; each file is
+        # read at most once per refresh
+        prefetched = {}
+        for file, child, future in hashing:
+            prefetched[file] = future.result()
+            _, stat, content_hash = prefetched[file]
+            if child.content_hash == content_hash:
+                child.mtime, child.size = stat.st_mtime, stat.st_size
+                metadata_changed = True
+                changes.upsert(child)
+                children.append(child)
+                continue
+            root_doc.unregister_doc(child)
+            changes.delete(child.path)
+            files_to_document.append(file)
+
+        if files_to_document:
+            logger.info(
+                f"Re-indexing {len(files_to_document)} file(s) in {parent_node.path}"
+            )
+            new_docs = list(
+                self._generate_file_docs(
+                    files_to_document, prefetched, executor
+                ).values()
+            )
+            for new_doc in new_docs:
+                root_doc.register_doc(new_doc)
+                changes.upsert(new_doc)
+            children.extend(new_docs)
+            docs_changed = True
+        children.sort(key=lambda doc: doc.path)
 
         for folder in folders:
-            doc_for_folder = Doc(path=folder, children=[], documentation="", summary="")
-            parent_node.children.append(doc_for_folder)
-            self.generate_documentation(doc_for_folder)
+            child = existing.pop(folder, None)
+            if child is None or child.content_hash is not None:
+                # new folder, or a file that was replaced by a folder
+                if child is not None:
+                    root_doc.unregister_doc(child)
+                    changes.delete(child.path)
+                logger.info(f"Indexing new folder {folder}")
+                child = Doc(path=folder, children=[], documentation="", summary="")
+                self.generate_documentation(child, executor)
+                root_doc.register_doc(child)
+                changes.upsert(child, recursive=True)
+                docs_changed = True
+            else:
+                child_docs_changed, child_metadata_changed = self._refresh(
+                    root_doc, child, changes, executor, listings
+                )
+                docs_changed = docs_changed or child_docs_changed
+                metadata_changed = metadata_changed or child_metadata_changed
+            children.append(child)
+
+        for deleted_doc in existing.values():
+            logger.info(f"Removing deleted path {deleted_doc.path} from the index")
+            root_doc.unregister_doc(deleted_doc)
+            changes.delete(deleted_doc.path)
+            docs_changed = True
+
+        parent_node.children = children
+        if docs_changed:
+            self._document_folder(parent_node)
+            changes.upsert(parent_node)
+        return docs_changed, metadata_changed
+
+    def refresh_stored_documentation(
+        self, doc_store: DocStore, changes: Optional[DocChanges] = None
+    ) -> Tuple[bool, bool]:
+        """
+        Like `refresh_documentation`, but for the index in `doc_store` without
+        loading it as a tree: the working tree is compared with the stored file
+        fingerprints, and only the direct children of a folder that changed are
+        read, to regenerate that folder's doc. Returns (docs_changed,
+        metadata_changed) and records every change in `changes`.
+        """
+        changes = changes if changes is not None else DocChanges()
+        root_path = doc_store.root_path()
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.max_workers
+        ) as executor:
+            listings = self._list_tree(root_path, executor)
+            return self._refresh_stored(
+                doc_store, root_path, changes, executor, listings
+            )
 
-        response, folder_name = self._generate_documentation_for_folder(
-            parent_node.path, parent_node.get_documentation_from_children()
-        )
-        parent_node.documentation = self._extract_documentation(response)
-        parent_node.summary = self._extract_summary(response)
+    def _refresh_stored(
+        self,
+        doc_store: DocStore,
+        path: str,
+        changes: DocChanges,
+        executor: concurrent.futures.Executor,
+        listings: Dict[str, concurrent.futures.Future],
+    ) -> Tuple[bool, bool]:
+        files, folders = listings[path].result()
+        existing = {row[0]: row for row in doc_store.load_fingerprints(path)}
+        docs_changed = metadata_changed = False
+        # children whose doc was (re)generated, by path
+        updated: Dict[str, Doc] = {}
+
+        files_to_document = []
+        hashing = []
+        for file in files:
+            row = existing.pop(file, None)
+            if row is not None and row[3] is not None:
+                _, mtime, size, content_hash = row
+                stat = os.stat(file)
+                if mtime == stat.st_mtime and size == stat.st_size:
+                    continue
+                future = executor.submit(read_file_with_fingerprint, file)
+                hashing.append((file, content_hash, future))
+                continue
+            if row is not None:
+                changes.delete(file)
+            files_to_document.append(file)
+
+        prefetched = {}
+        for file, stored_hash, future in hashing:
+            prefetched[file] = future.result()
+            _, stat, content_hash = prefetched[file]
+            if stored_hash == content_hash:
+                changes.update_fingerprint(file, stat.st_mtime, stat.st_size)
+                metadata_changed = True
+                continue
+            changes.delete(file)
+            files_to_document.append(file)
+
+        if files_to_document:
+            logger.info(f"Re-indexing {len(files_to_document)} file(s) in {path}")
+            updated.update(
+                self._generate_file_docs(files_to_document, prefetched, executor)
+            )
+            for new_doc in updated.values():
+                changes.upsert(new_doc)
+            docs_changed = True
+
+        for folder in folders:
+            row = existing.pop(folder, None)
+            if row is None or row[3] is not None:
+                # new folder, or a file that was replaced by a folder
+                if row is not None:
+                    changes.delete(folder)
+                logger.info(f"Indexing new folder {folder}")
+                child = Doc(path=folder, children=[], documentation="", summary="")
+                self.generate_documentation(child, executor)
+                changes.upsert(child, recursive=True)
+                updated[folder] = child
+                docs_changed = True
+                continue
+            child_docs_changed, child_metadata_changed = self._refresh_stored(
+                doc_store, folder, changes, executor, listings
+            )
+            if child_docs_changed:
+                updated[folder] = changes.upserted[folder]
+            docs_changed = docs_changed or child_docs_changed
+            metadata_changed = metadata_changed or child_metadata_changed
+
+        for deleted_path in existing:
+            logger.info(f"Removing deleted path {deleted_path} from the index")
+            changes.delete(deleted_path)
+            docs_changed = True
+
+        if docs_changed:
+            # stored docs of deleted children (or of files that failed to
+            # re-document) are left out
+            stored = {doc.path: doc for doc in doc_store.load_children(path)}
+            deleted = set(changes.deleted)
+            children = [
+                updated[child_path] if child_path in updated else stored[child_path]
+                for child_path in files + folders
+                if child_path in updated
+                or (child_path in stored and child_path not in deleted)
+            ]
+            folder_node = Doc.model_construct(
+                path=path, children=children, documentation="", summary=""
+            )
+            self._document_folder(folder_node)
+            changes.upsert(folder_node)
+        return docs_changed, metadata_changed
 
     def generate_documentation_json(self) -> Dict[str, Any]:
         return self.root_doc.get_dict()
@@ -172,75 +678,31 @@ class DocUtils:
     ) -> Doc:
 
         # Find the doc in the tree
-        doc = self._find_doc(root_doc, os.path.dirname(file_path))
+        doc = find_doc(root_doc, os.path.dirname(file_path))
         if not doc:
             raise FileNotFoundError("Doc for the directory not found in the tree")
 
         if is_file_exists:
             # find the relevant
-            update_doc = None
-            for child in doc.children:
-                if child.path == file_path:
-                    update_doc = child
-                    break
-
-            if not update_doc:
+            index = next(
+                (i for i, child in enumerate(doc.children) if child.path == file_path),
+                None,
+            )
+            if index is None:
                 raise FileNotFoundError("Doc for the file not found in the tree")
 
-            with open(file_path, "r") as file:
-                code = file.read()
-            response, _ = self._generate_documentation_for_file(code, file_path)
-            update_doc.documentation = self._extract_documentation(response)
-            update_doc.summary = self._extract_summary(response)
+            new_doc = self._generate_file_doc(file_path)
+            root_doc.unregister_doc(doc.children[index])
+            doc.children[index] = new_doc
         else:
-            with open(file_path, "r") as file:
-                code = file.read()
-            response, _ = self._generate_documentation_for_file(code, file_path)
-            documentation = self._extract_documentation(response)
-            summary = self._extract_summary(response)
-            doc.children.append(
-                Doc(
-                    path=file_path,
-                    children=[],
-                    documentation=documentation,
-                    summary=summary,
-                )
-            )
+            new_doc = self._generate_file_doc(file_path)
+            doc.children.append(new_doc)
+        root_doc.register_doc(new_doc)
 
         return root_doc
 
-    @staticmethod
-    def _find_doc(root_doc: Doc, directory_path: str) -> Doc:
-        if not os.path.isdir(directory_path):
-            raise ValueError(f"Directory {directory_path} does not exist.")
-
-        # self.doc is a recursive structure with a path and children: [doc1, doc2, ...]
-        # if the path of the doc matches the directory_path return all the children
-        def find_document(doc: Doc, directory_path: str) -> Optional[Doc]:
-            if directory_path in [
-                doc.path,
-                f"{doc.path}/",
-                f"/{doc.path}",
-                f"/{doc.path}/",
-                f"./{doc.path}",
-                f"./{doc.path}/",
-            ]:
-                return doc
-
-            # if the doc is a directory, search in its children
-            for child in doc.children:
-                if os.path.isdir(child.path):
-                    target = find_document(child, directory_path)
-                    if target:
-                        return target
-
-            return None
-
-        if directory_path in [".", "./", "/"]:
-            return root_doc
-        doc = find_document(root_doc, directory_path)
-        return doc
-
     def get_prompt(self, prompt_file_name) -> str:
-        with open(f"supercoder/prompts/{prompt_file_name}", "r") as file:
-            return file.read()
+        if prompt_file_name not in self._prompts:
+            with open(f"agents/prompts/{prompt_file_name}", "r") as file:
+                self._prompts[prompt_file_name] = file.read()
+        return self._prompts[prompt_file_name]
@@ -2,104 +2,183 @@ import os
 from typing import Optional, List, Dict, Any
 import concurrent.futures
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
 
 from lib import logger
 
 
+LAZY_DOC_FIELDS = ("children", "documentation", "summary")
+
+
+def normalize_doc_path(path: str) -> str:
+    """
+    Normalizes a path so that `a/b`, `a/b/`, `/a/b`, `./a/b` etc. share one key.
+    The repository root normalizes to an empty string.
+    """
+    path = os.path.normpath(path.strip()).lstrip("/")
+    return "" if path == "." else path
+
+
 class Doc(BaseModel):
     children: Optional[List["Doc"]]
     path: str
     documentation: str
     summary: str
+    # fingerprint of the file the doc was generated from; None for folders
+    mtime: Optional[float] = None
+    size: Optional[int] = None
+    content_hash: Optional[str] = None
+
+    # normalized path -> Doc for the whole subtree; only maintained on the root doc
+    _path_index: Optional[Dict[str, "Doc"]] = PrivateAttr(default=None)
 
     @classmethod
     def is_leaf_node(cls, doc: "Doc") -> bool:
         return doc.children is None or len(doc.children) == 0
 
+    def build_path_index(self) -> Dict[str, "Doc"]:
+        self._path_index = {}
+        self.register_doc(self)
+        return self._path_index
+
+    def register_doc(self, doc: "Doc"):
+        """Adds `doc` and its subtree to the path index of this (root) doc."""
+        if self._path_index is None:
+            self.build_path_index()
+            return
+        stack = [doc]
+        while stack:
+            current = stack.pop()
+            self._path_index[normalize_doc_path(current.path)] = current
+            stack.extend(current.loaded_children())
+
+    def unregister_doc(self, doc: "Doc"):
+        """Removes `doc` and its subtree from the path index of this (root) doc."""
+        if self._path_index is None:
+            return
+        stack = [doc]
+        while stack:
+            current = stack.pop()
+            self._path_index.pop(normalize_doc_path(current.path), None)
+            stack.extend(current.loaded_children())
+
+    def loaded_children(self) -> List["Doc"]:
+        """Children that are already in memory; never triggers a lazy load."""
+        return self.__dict__.get("children") or []
+
+    def lookup(self, path: str) -> Optional["Doc"]:
+        if self._path_index is None:
+            self.build_path_index()
+        key = normalize_doc_path(path)
+        if not key:
+            return self
+        return self._path_index.get(key)
+
     def get_documentation_from_children(self) -> list:
         return [child.documentation for child in self.children]
 
-    def get_dict(self, depth=0, max_depth=10) -> Dict[str, Any]:
-        if depth > max_depth:
-            return {
-                "path": self.path,
-                "documentation": self.documentation,
-                "summary": self.summary,
-            }
-        else:
-            return {
-                "path": self.path,
-                "documentation": self.documentation,
-                "summary": self.summary,
-                "children": [
-                    child.get_dict(depth + 1, max_depth) for child in self.children
-                ],
-            }
-
-
-def list_files_in_doc(root_doc, directory_path: str) -> List[Doc]:
-    if not os.path.isdir(directory_path):
-        raise ValueError(f"Directory {directory_path} does not exist.")
+    def get_dict(self, depth=0, max_depth: Optional[int] = None) -> Dict[str, Any]:
+        doc_dict = {
+            "path": self.path,
+            "documentation": self.documentation,
+            "summary": self.summary,
+            "mtime": self.mtime,
+            "size": self.size,
+            "content_hash": self.content_hash,
+        }
+        if max_depth is None or depth <= max_depth:
+            doc_dict["children"] = [
+                child.get_dict(depth + 1, max_depth) for child in self.children
+            ]
+        return doc_dict
 
-    # self.doc is a recursive structure with a path and children: [doc1, doc2, ...]
-    # if the path of the doc matches the directory_path return all the children
-    def list_files(doc: Doc, dir_path: str) -> List[Doc]:
-        logger.debug(f"Doc path: {doc.path}, Directory path: {dir_path}")
-        if dir_path in [
-            doc.path,
-            f"{doc.path}/",
-            f"/{doc.path}",
-            f"/{doc.path}/",
-            f"./{doc.path}",
-            f"./{doc.path}/",
-        ]:
-            return doc.children
-
-        # if the doc is a directory, search in its children
-        for child in doc.children:
-            if os.path.isdir(child.path):
-                if files := list_files(child, dir_path):
-                    return files
-
-        return []
-
-    if directory_path in [".", "./", "/"]:
-        return root_doc.children
-    files = list_files(root_doc, directory_path)
-    return files
-
-
-def find_doc(root_doc, directory_path: str) -> Optional[Doc]:
-    if not os.path.isdir(directory_path):
-        raise ValueError(f"Directory {directory_path} does not exist.")
 
-    # self.doc is a recursive structure with a path and children: [doc1, doc2, ...]
-    # if the path of the doc matches the directory_path return all the children
-    def find_document(doc: Doc, dir_path: str) -> Optional[Doc]:
-        if dir_path in [
-            doc.path,
-            f"{doc.path}/",
-            f"/{doc.path}",
-            f"/{doc.path}/",
-            f"./{doc.path}",
-            f"./{doc.path}/",
-        ]:
-            return doc
+class LazyDoc(Doc):
+    """
+    A Doc whose `children`, `documentation` and `summary` are fetched from a doc
+    store the first time they are accessed, so memory grows with the parts of the
+    tree that are actually used. `loader` must provide `load_lazy_children(path)`
+    and `load_text(path)` (see `DocStore`).
+    """
 
-        # if the doc is a directory, search in its children
-        for child in doc.children:
-            if os.path.isdir(child.path):
-                target = find_document(child, dir_path)
-                if target:
-                    return target
+    _loader: Any = PrivateAttr(default=None)
 
+    @classmethod
+    def stub(
+        cls,
+        loader: Any,
+        path: str,
+        mtime: Optional[float] = None,
+        size: Optional[int] = None,
+        content_hash: Optional[str] = None,
+    ) -> "LazyDoc":
+        # lazy fields are left out of __dict__ so that accessing them hits __getattr__
+        doc = cls.model_construct(
+            path=path, mtime=mtime, size=size, content_hash=content_hash
+        )
+        doc._loader = loader
+        return doc
+
+    def __getattr__(self, item: str) -> Any:
+        if item in LAZY_DOC_FIELDS:
+            if item == "children":
+                self.__dict__["children"] = self._loader.load_lazy_children(self.path)
+            else:
+                documentation, summary = self._loader.load_text(self.path)
+                self.__dict__.setdefault("documentation", documentation)
+                self.__dict__.setdefault("summary", summary)
+            return self.__dict__[item]
+        return super().__getattr__(item)
+
+    def hydrate(self):
+        """Loads every lazy field of the whole subtree."""
+        stack = [self]
+        while stack:
+            current = stack.pop()
+            _ = current.documentation
+            stack.extend(current.children)
+
+    def model_dump(self, **kwargs) -> Dict[str, Any]:
+        self.hydrate()
+        return super().model_dump(**kwargs)
+
+    def lookup(self, path: str) -> Optional[Doc]:
+        if self._path_index is None:
+            # a full index would load every folder; it is filled in on demand instead
+            self._path_index = {normalize_doc_path(self.path): self}
+        if doc := super().lookup(path):
+            return doc
+        key = normalize_doc_path(path)
+        # Descend from the closest indexed ancestor, loading only the docs on the way
+        current, parent_key = self, os.path.dirname(key)
+        while parent_key:
+            if parent_key in self._path_index:
+                current = self._path_index[parent_key]
+                break
+            parent_key = os.path.dirname(parent_key)
+        while current is not None:
+            next_doc = None
+            for child in current.children:
+                self.register_doc(child)
+                child_key = normalize_doc_path(child.path)
+                if child_key == key:
+                    return child
+                if key.startswith(f"{child_key}/"):
+                    next_doc = child
+            current = next_doc
         return None
 
-    if directory_path in [".", "./", "/"]:
-        return root_doc
-    target_doc = find_document(root_doc, directory_path)
-    return target_doc
+
+def list_files_in_doc(root_doc: Doc, directory_path: str) -> List[Doc]:
+    target_doc = root_doc.lookup(directory_path)
+    if target_doc is None:
+        raise ValueError(f"Directory {directory_path} does not exist.")
+    return target_doc.children
+
+
+def find_doc(root_doc: Doc, directory_path: str) -> Optional[Doc]:
+    # O(1) lookup in the root's path index; no file system access
+    return root_doc.lookup(directory_path)
 
 
 def fetch_docs(root_doc, files_dirs_path: List[str]) -> Dict[str, Doc]:
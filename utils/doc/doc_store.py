@@ -0,0 +1,261 @@
+import os
+import sqlite3
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.doc.doc_model import Doc, LazyDoc
+
+# Only file rows carry a content hash, so this lists files before folders, each by
+# path: the order DocUtils gives the children of a folder
+CHILD_ORDER = "content_hash IS NULL, path"
+
+
+@dataclass
+class DocChanges:
+    """
+    Docs to upsert, paths (with their subtrees) to delete and file fingerprints to
+    update (for files whose content did not change) in a `DocStore`.
+    """
+
+    upserted: Dict[str, Doc] = field(default_factory=dict)
+    deleted: List[str] = field(default_factory=list)
+    fingerprints: Dict[str, Tuple[float, int]] = field(default_factory=dict)
+
+    def upsert(self, doc: Doc, recursive: bool = False):
+        stack = [doc]
+        while stack:
+            current = stack.pop()
+            self.upserted[current.path] = current
+            if recursive:
+                stack.extend(current.children or [])
+
+    def delete(self, path: str):
+        self.deleted.append(path)
+
+    def update_fingerprint(self, path: str, mtime: float, size: int):
+        self.fingerprints[path] = (mtime, size)
+
+    def __bool__(self):
+        return bool(self.upserted or self.deleted or self.fingerprints)
+
+
+class DocStore:
+    """
+    SQLite backed store for the documentation index. Every doc is one row keyed by
+    its path, with a link to its parent, so a single subtree can be loaded on demand
+    and changes are written row by row instead of rewriting the whole index.
+
+    Generated documentation is also cached by content key and model in a separate
+    table that survives index rebuilds, so unchanged content is never re-documented.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS docs (
+                path TEXT PRIMARY KEY,
+                parent TEXT,
+                documentation TEXT NOT NULL DEFAULT '',
+                summary TEXT NOT NULL DEFAULT '',
+                mtime REAL,
+                size INTEGER,
+                content_hash TEXT
+            );
+            CREATE INDEX IF NOT EXISTS docs_parent ON docs (parent);
+            CREATE TABLE IF NOT EXISTS doc_cache (
+                key TEXT NOT NULL,
+                model TEXT NOT NULL,
+                documentation TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                PRIMARY KEY (key, model)
+            );
+            """
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def is_empty(self) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM docs LIMIT 1").fetchone() is None
+
+    @staticmethod
+    def _parent_path(doc: Doc, root_path: Optional[str]) -> Optional[str]:
+        if doc.path == root_path:
+            return None
+        parent = os.path.dirname(doc.path)
+        # children of a root given as `repo/` are joined as `repo/child`
+        if root_path and os.path.normpath(parent) == os.path.normpath(root_path):
+            return root_path
+        return parent
+
+    @staticmethod
+    def _row(doc: Doc, parent: Optional[str]) -> tuple:
+        return (
+            doc.path,
+            parent,
+            doc.documentation,
+            doc.summary,
+            doc.mtime,
+            doc.size,
+            doc.content_hash,
+        )
+
+    def _upsert_rows(self, docs: Iterable[Doc], root_path: Optional[str]):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO docs "
+            "(path, parent, documentation, summary, mtime, size, content_hash) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self._row(doc, self._parent_path(doc, root_path)) for doc in docs),
+        )
+
+    @staticmethod
+    def _subtree_pattern(path: str) -> str:
+        escaped = path.rstrip("/")
+        escaped = escaped.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return f"{escaped}/%"
+
+    def _delete_subtree(self, path: str):
+        self.conn.execute(
+            "DELETE FROM docs WHERE path = ? OR path LIKE ? ESCAPE '\\'",
+            (path, self._subtree_pattern(path)),
+        )
+
+    def root_path(self) -> Optional[str]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT path FROM docs WHERE parent IS NULL LIMIT 1"
+            ).fetchone()
+        return row[0] if row else None
+
+    def save_tree(self, root_doc: Doc):
+        """Replaces the stored index with the tree under `root_doc`."""
+
+        def walk(doc: Doc):
+            yield doc
+            for child in doc.children or []:
+                yield from walk(child)
+
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM docs")
+            self._upsert_rows(walk(root_doc), root_doc.path)
+
+    def apply_changes(self, changes: DocChanges):
+        """Writes only the changed rows, in a single transaction."""
+        if not changes:
+            return
+        root_path = self.root_path()
+        with self._lock, self.conn:
+            for path in changes.deleted:
+                self._delete_subtree(path)
+            self._upsert_rows(changes.upserted.values(), root_path)
+            self.conn.executemany(
+                "UPDATE docs SET mtime = ?, size = ? WHERE path = ?",
+                (
+                    (mtime, size, path)
+                    for path, (mtime, size) in changes.fingerprints.items()
+                ),
+            )
+
+    @staticmethod
+    def _doc_from_row(row: tuple) -> Doc:
+        path, _, documentation, summary, mtime, size, content_hash = row
+        # rows come from our own writes, so pydantic validation is skipped
+        return Doc.model_construct(
+            path=path,
+            children=[],
+            documentation=documentation,
+            summary=summary,
+            mtime=mtime,
+            size=size,
+            content_hash=content_hash,
+        )
+
+    def load_children(self, path: str) -> List[Doc]:
+        """Loads the direct children of `path`, without their own children."""
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT * FROM docs WHERE parent = ? ORDER BY {CHILD_ORDER}", (path,)
+            ).fetchall()
+        return [self._doc_from_row(row) for row in rows]
+
+    def load_tree(self, path: Optional[str] = None) -> Optional[Doc]:
+        """
+        Loads the subtree rooted at `path` (default: the whole index) with no depth
+        limit. Returns None if `path` is not in the index.
+        """
+        path = path or self.root_path()
+        if path is None:
+            return None
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT * FROM docs WHERE path = ? OR path LIKE ? ESCAPE '\\' "
+                f"ORDER BY {CHILD_ORDER}",
+                (path, self._subtree_pattern(path)),
+            ).fetchall()
+        docs = {row[0]: (self._doc_from_row(row), row[1]) for row in rows}
+        if path not in docs:
+            return None
+        for doc, parent in docs.values():
+            if doc.path != path and parent in docs:
+                docs[parent][0].children.append(doc)
+        return docs[path][0]
+
+    def load_fingerprints(
+        self, path: str
+    ) -> List[Tuple[str, Optional[float], Optional[int], Optional[str]]]:
+        """(path, mtime, size, content_hash) of the direct children of `path`."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT path, mtime, size, content_hash FROM docs "
+                f"WHERE parent = ? ORDER BY {CHILD_ORDER}",
+                (path,),
+            ).fetchall()
+
+    def load_lazy_children(self, path: str) -> List[LazyDoc]:
+        """Loads the direct children of `path` as `LazyDoc` stubs, without their text."""
+        return [LazyDoc.stub(self, *row) for row in self.load_fingerprints(path)]
+
+    def load_text(self, path: str) -> Tuple[str, str]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT documentation, summary FROM docs WHERE path = ?", (path,)
+            ).fetchone()
+        return row if row else ("", "")
+
+    def load_lazy_tree(self, path: Optional[str] = None) -> Optional[LazyDoc]:
+        """Returns the doc at `path` (default: the root) as a `LazyDoc` stub."""
+        path = path or self.root_path()
+        if path is None:
+            return None
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT path, mtime, size, content_hash FROM docs WHERE path = ?",
+                (path,),
+            ).fetchone()
+        return LazyDoc.stub(self, *row) if row else None
+
+    def get_cached_doc(self, key: str, model: str) -> Optional[Tuple[str, str]]:
+        """Returns the cached (documentation, summary) for `key`, if any."""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT documentation, summary FROM doc_cache WHERE key = ? AND model = ?",
+                (key, model),
+            ).fetchone()
+        return row
+
+    def cache_doc(self, key: str, model: str, documentation: str, summary: str):
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO doc_cache (key, model, documentation, summary) "
+                "VALUES (?, ?, ?, ?)",
+                (key, model, documentation, summary),
+            )
@@ -0,0 +1,196 @@
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+# Used when no ignore file covers them; the cheapest trees to skip are the biggest ones
+DEFAULT_IGNORE_PATTERNS = [
+    "node_modules/",
+    "__pycache__/",
+    "*.py[cod]",
+    "venv/",
+    ".venv/",
+]
+
+
+@dataclass(frozen=True)
+class GitIgnoreRule:
+    regex: re.Pattern
+    base_dir: str
+    negated: bool
+    dir_only: bool
+
+
+def _translate(pattern: str) -> str:
+    """Translates a gitignore glob (already stripped of `!` and trailing `/`) to a regex."""
+    anchored = "/" in pattern
+    pattern = pattern.lstrip("/")
+    regex = "" if anchored else "(?:.*/)?"
+    i, n = 0, len(pattern)
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith("**/", i):
+            regex += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("/**", i) and i + 3 == n:
+            regex += "/.*"
+            i += 3
+        elif pattern.startswith("**", i):
+            regex += ".*"
+            i += 2
+        elif c == "*":
+            regex += "[^/]*"
+            i += 1
+        elif c == "?":
+            regex += "[^/]"
+            i += 1
+        elif c == "[":
+            end = pattern.find("]", i + 2)
+            if end == -1:
+                regex += re.escape(c)
+                i += 1
+            else:
+                body = pattern[i + 1 : end]
+                if body[0] in "!^":
+                    body = "^" + body[1:]
+                regex += f"[{body.replace(chr(92), chr(92) * 2)}]"
+                i = end + 1
+        elif c == "\\" and i + 1 < n:
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(c)
+            i += 1
+    return regex
+
+
+def compile_rule(line: str, base_dir: str) -> Optional[GitIgnoreRule]:
+    line = line.rstrip("\n")
+    # trailing spaces are ignored unless escaped
+    stripped = line.rstrip(" ")
+    if stripped.endswith("\\") and len(stripped) < len(line):
+        stripped += " "
+    line = stripped
+    if not line or line.startswith("#"):
+        return None
+    negated = line.startswith("!")
+    if negated:
+        line = line[1:]
+    elif line.startswith("\\!") or line.startswith("\\#"):
+        line = line[1:]
+    dir_only = line.endswith("/")
+    line = line.rstrip("/")
+    if not line:
+        return None
+    return GitIgnoreRule(
+        regex=re.compile(_translate(line)),
+        base_dir=base_dir,
+        negated=negated,
+        dir_only=dir_only,
+    )
+
+
+def read_rules(ignore_file: str, base_dir: str) -> List[GitIgnoreRule]:
+    try:
+        with open(ignore_file, "r", errors="replace") as f:
+            lines = f.readlines()
+    except OSError:
+        return []
+    return [rule for line in lines if (rule := compile_rule(line, base_dir))]
+
+
+class GitIgnoreMatcher:
+    """
+    Compiled matcher for the ignore rules of a repository: nested `.gitignore`
+    files, `.git/info/exclude` and optional extra ignore files, with git's
+    precedence (deeper files and later lines win, `!` re-includes). Rules are
+    compiled once per directory and decisions for directories are memoized, so a
+    walker that stops at ignored directories never looks inside them.
+
+    Instances are callable as `matcher(path, is_dir=None)`.
+    """
+
+    def __init__(
+        self,
+        root_path: str,
+        extra_ignore_files: Optional[List[str]] = None,
+        use_default_patterns: bool = True,
+    ):
+        self.root_path = os.path.abspath(root_path)
+        root_rules = []
+        if use_default_patterns:
+            root_rules += [
+                compile_rule(pattern, self.root_path)
+                for pattern in DEFAULT_IGNORE_PATTERNS
+            ]
+        for ignore_file in extra_ignore_files or []:
+            root_rules += read_rules(ignore_file, self.root_path)
+        root_rules += read_rules(
+            os.path.join(self.root_path, ".git", "info", "exclude"), self.root_path
+        )
+        root_rules += read_rules(
+            os.path.join(self.root_path, ".gitignore"), self.root_path
+        )
+        self._rules_by_dir: Dict[str, Tuple[GitIgnoreRule, ...]] = {
+            self.root_path: tuple(root_rules)
+        }
+        self._dir_ignored: Dict[str, bool] = {self.root_path: False}
+
+    def _is_under_root(self, path: str) -> bool:
+        return path == self.root_path or path.startswith(self.root_path + os.sep)
+
+    def _rules_for_dir(self, dir_path: str) -> Tuple[GitIgnoreRule, ...]:
+        rules = self._rules_by_dir.get(dir_path)
+        if rules is None:
+            if not self._is_under_root(dir_path):
+                return ()
+            parent_rules = self._rules_for_dir(os.path.dirname(dir_path))
+            rules = parent_rules + tuple(
+                read_rules(os.path.join(dir_path, ".gitignore"), dir_path)
+            )
+            self._rules_by_dir[dir_path] = rules
+        return rules
+
+    def _match(self, path: str, is_dir: bool) -> bool:
+        ignored = False
+        relative_paths: Dict[str, str] = {}
+        for rule in self._rules_for_dir(os.path.dirname(path)):
+            if rule.dir_only and not is_dir:
+                continue
+            relative_path = relative_paths.get(rule.base_dir)
+            if relative_path is None:
+                relative_path = os.path.relpath(path, rule.base_dir).replace(
+                    os.sep, "/"
+                )
+                relative_paths[rule.base_dir] = relative_path
+            if rule.regex.fullmatch(relative_path):
+                ignored = not rule.negated
+        return ignored
+
+    def _is_dir_ignored(self, dir_path: str) -> bool:
+        ignored = self._dir_ignored.get(dir_path)
+        if ignored is None:
+            parent = os.path.dirname(dir_path)
+            # nothing below an ignored directory can be re-included
+            ignored = (
+                parent != dir_path
+                and self._is_under_root(parent)
+                and self._is_dir_ignored(parent)
+            ) or self._match(dir_path, is_dir=True)
+            self._dir_ignored[dir_path] = ignored
+        return ignored
+
+    def is_ignored(self, path: str, is_dir: Optional[bool] = None) -> bool:
+        path = os.path.abspath(path)
+        if path == self.root_path or not self._is_under_root(path):
+            return False
+        if is_dir is None:
+            is_dir = os.path.isdir(path)
+        if is_dir:
+            return self._is_dir_ignored(path)
+        return self._is_dir_ignored(os.path.dirname(path)) or self._match(
+            path, is_dir=False
+        )
+
+    def __call__(self, path: str, is_dir: Optional[bool] = None) -> bool:
+        return self.is_ignored(path, is_dir)
@@ -0,0 +1,240 @@
+import ast
+import hashlib
+import json
+import os
+import concurrent.futures
+from typing import Callable, Dict, List, Optional, Tuple
+
+import networkx as nx
+
+from lib import logger
+from utils.import_resolver import ModuleResolver
+
+# Directories that never contain first-party code worth graphing
+SKIPPED_DIRS = {"__pycache__", "node_modules", "venv", "site-packages"}
+# Below this many changed files the process pool costs more than it saves
+MIN_FILES_FOR_PROCESS_POOL = 64
+
+
+def hash_content(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()
+
+
+def parse_imports(source: bytes) -> List[Dict]:
+    """Returns the raw import statements of a python source, unresolved."""
+    tree = ast.parse(source)
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.append(
+                    {
+                        "module": alias.name,
+                        "level": 0,
+                        "names": [],
+                        "line_no": node.lineno,
+                    }
+                )
+        elif isinstance(node, ast.ImportFrom):
+            imports.append(
+                {
+                    "module": node.module or "",
+                    "level": node.level,
+                    "names": [[alias.name, alias.asname] for alias in node.names],
+                    "line_no": node.lineno,
+                }
+            )
+    return imports
+
+
+def _parse_file(
+    path: str, cached_hash: Optional[str] = None
+) -> Tuple[str, Optional[str], Optional[List[Dict]]]:
+    """
+    Returns the path, content hash and imports of a file. The imports are None
+    when the content still hashes to `cached_hash`; the file is then not parsed.
+    """
+    # Runs inside the worker processes; must stay a picklable top-level function
+    try:
+        with open(path, "rb") as f:
+            content = f.read()
+        content_hash = hash_content(content)
+    except OSError:
+        return path, None, []
+    if content_hash == cached_hash:
+        return path, content_hash, None
+    try:
+        return path, content_hash, parse_imports(content)
+    except (SyntaxError, ValueError):
+        return path, content_hash, []
+
+
+class ImportGraphCache:
+    """
+    On-disk cache of the raw imports of every python file in a repository, keyed
+    by content hash. The file's mtime and size are stored as well so unchanged
+    files are not even read on the next build.
+    """
+
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.entries: Dict[str, Dict] = {}
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, "r") as f:
+                    self.entries = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Ignoring unreadable import cache {cache_path}: {e}")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+        tmp_path = f"{self.cache_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.cache_path)
+
+
+def _list_python_files(base_path: str) -> Dict[str, os.stat_result]:
+    files = {}
+    for dir_path, dir_names, file_names in os.walk(base_path):
+        dir_names[:] = [
+            d for d in dir_names if not d.startswith(".") and d not in SKIPPED_DIRS
+        ]
+        for file_name in file_names:
+            if file_name.endswith(".py"):
+                path = os.path.join(dir_path, file_name)
+                try:
+                    files[path] = os.stat(path)
+                except OSError:
+                    continue
+    return files
+
+
+def build_repo_graph(
+    base_path: str,
+    cache_path: Optional[str] = None,
+    max_workers: Optional[int] = None,
+    fallback: Optional[Callable[[str, Dict], Optional[str]]] = None,
+) -> nx.DiGraph:
+    """
+    Builds the import graph of every python file under `base_path`. Files are
+    parsed in parallel with a process pool, and only files whose content hash
+    differs from the cache at `cache_path` are re-parsed. Imports are resolved
+    against the in-memory file list, so unchanged files cost no parsing at all.
+
+    Repo imports the static resolver cannot place are passed, with the path of the
+    importing file, to `fallback` (e.g. a language server lookup), which returns
+    the imported file or None. The number of imports resolved by each path is
+    stored in `G.graph["import_resolution"]`.
+    """
+    base_path = os.path.abspath(base_path)
+    cache_path = cache_path or os.path.join(
+        "saved_states/call_graphs", os.path.basename(base_path), "import_cache.json"
+    )
+    cache = ImportGraphCache(cache_path)
+    files = _list_python_files(base_path)
+
+    entries = {}
+    # files whose mtime or size changed, with their cached hash; they are hashed
+    # first and only parsed if the hash differs
+    to_parse = []
+    cached_hashes = []
+    for path, stat in files.items():
+        relative_path = os.path.relpath(path, base_path)
+        entry = cache.entries.get(relative_path)
+        if (
+            entry
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+        ):
+            entries[relative_path] = entry
+        else:
+            to_parse.append(path)
+            cached_hashes.append(entry["hash"] if entry else None)
+
+    num_reparsed = 0
+    if to_parse:
+        if len(to_parse) >= MIN_FILES_FOR_PROCESS_POOL:
+            num_workers = max_workers or os.cpu_count() or 1
+            chunk_size = max(1, len(to_parse) // (num_workers * 4))
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=num_workers
+            ) as executor:
+                results = list(
+                    executor.map(
+                        _parse_file, to_parse, cached_hashes, chunksize=chunk_size
+                    )
+                )
+        else:
+            results = [
+                _parse_file(path, cached_hash)
+                for path, cached_hash in zip(to_parse, cached_hashes)
+            ]
+
+        for path, content_hash, imports in results:
+            if content_hash is None:
+                continue
+            relative_path = os.path.relpath(path, base_path)
+            if imports is None:
+                # touched but not modified; keep the cached imports
+                imports = cache.entries[relative_path]["imports"]
+            else:
+                num_reparsed += 1
+            entries[relative_path] = {
+                "hash": content_hash,
+                "mtime_ns": files[path].st_mtime_ns,
+                "size": files[path].st_size,
+                "imports": imports,
+            }
+
+    if entries != cache.entries:
+        cache.entries = entries
+        cache.save()
+
+    resolver = ModuleResolver(base_path, files=files.keys())
+    resolution_counts = {"ast": 0, "lsp": 0, "unresolved": 0}
+    G = nx.DiGraph()
+    for relative_path, entry in entries.items():
+        G.add_node(relative_path)
+        file_path = os.path.join(base_path, relative_path)
+        for import_info in entry["imports"]:
+            names = [name for name, _ in import_info["names"]]
+            targets = resolver.resolve_import(
+                import_info["module"],
+                file_path,
+                level=import_info["level"],
+                names=names,
+            )
+            if targets:
+                resolution_counts["ast"] += 1
+            elif resolver.is_repo_module(
+                import_info["module"], file_path, level=import_info["level"]
+            ):
+                target = fallback(file_path, import_info) if fallback else None
+                if target is None:
+                    resolution_counts["unresolved"] += 1
+                    continue
+                resolution_counts["lsp"] += 1
+                targets = [target]
+            for target in targets:
+                node = os.path.relpath(target, base_path)
+                if G.has_edge(relative_path, node):
+                    G.edges[relative_path, node]["imports"].extend(
+                        import_info["names"]
+                    )
+                else:
+                    G.add_edge(
+                        relative_path, node, imports=list(import_info["names"])
+                    )
+
+    logger.info(
+        f"Import graph for {base_path}: {len(entries)} files, {num_reparsed} re-parsed, "
+        f"{G.number_of_edges()} edges"
+    )
+    logger.info(
+        f"Resolved imports: {resolution_counts['ast']} statically, "
+        f"{resolution_counts['lsp']} via LSP, {resolution_counts['unresolved']} unresolved"
+    )
+    G.graph["files_reparsed"] = num_reparsed
+    G.graph["import_resolution"] = resolution_counts
+    return G
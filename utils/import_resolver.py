@@ -0,0 +1,149 @@
+import os
+from typing import Dict, Iterable, List, Optional, Set
+
+
+class ModuleResolver:
+    """
+    Resolves python import statements to files inside a repository using only the
+    file system layout (no language server). Handles absolute imports from the repo
+    root and `src/` layouts, relative imports, regular packages (`__init__.py`) and
+    namespace packages (directories without `__init__.py`).
+
+    If `files` is given, lookups are answered from that set of absolute paths instead
+    of stat calls; otherwise file system checks are memoized per resolver.
+    """
+
+    def __init__(
+        self,
+        repo_root: str,
+        source_roots: Optional[List[str]] = None,
+        files: Optional[Iterable[str]] = None,
+    ):
+        self.repo_root = os.path.abspath(repo_root)
+        self._files: Optional[Set[str]] = None
+        self._dirs: Optional[Set[str]] = None
+        if files is not None:
+            self._index_files(files)
+        self._isfile_cache: Dict[str, bool] = {}
+        self._isdir_cache: Dict[str, bool] = {}
+        self.source_roots = source_roots or self.discover_source_roots()
+
+    def _index_files(self, files: Iterable[str]):
+        self._files = set()
+        self._dirs = set()
+        for path in files:
+            path = os.path.abspath(path)
+            self._files.add(path)
+            parent = os.path.dirname(path)
+            while parent.startswith(self.repo_root) and parent not in self._dirs:
+                self._dirs.add(parent)
+                parent = os.path.dirname(parent)
+
+    def _isfile(self, path: str) -> bool:
+        if self._files is not None:
+            return path in self._files
+        if path not in self._isfile_cache:
+            self._isfile_cache[path] = os.path.isfile(path)
+        return self._isfile_cache[path]
+
+    def _isdir(self, path: str) -> bool:
+        if self._dirs is not None:
+            return path in self._dirs
+        if path not in self._isdir_cache:
+            self._isdir_cache[path] = os.path.isdir(path)
+        return self._isdir_cache[path]
+
+    def discover_source_roots(self) -> List[str]:
+        source_roots = [self.repo_root]
+        src_dir = os.path.join(self.repo_root, "src")
+        if self._isdir(src_dir):
+            source_roots.append(src_dir)
+        return source_roots
+
+    def _resolve_in(self, base: str, parts: List[str]) -> Optional[str]:
+        """
+        Returns the module file, the `__init__.py` of a package, or the directory of a
+        namespace package. Returns None if `parts` does not exist under `base`.
+        """
+        target = os.path.join(base, *parts)
+        if parts and self._isfile(target + ".py"):
+            return target + ".py"
+        if self._isfile(os.path.join(target, "__init__.py")):
+            return os.path.join(target, "__init__.py")
+        if parts and self._isdir(target):
+            return target
+        return None
+
+    def _candidate_bases(self, current_file: str, level: int) -> List[str]:
+        current_dir = os.path.dirname(os.path.abspath(current_file))
+        if level > 0:
+            base = current_dir
+            for _ in range(level - 1):
+                base = os.path.dirname(base)
+            return [base]
+        # implicit relative imports are also tried, mirroring `is_repo_module`
+        return self.source_roots + [current_dir]
+
+    def resolve_module(
+        self, module_name: str, current_file: str, level: int = 0
+    ) -> Optional[str]:
+        parts = [p for p in module_name.split(".") if p] if module_name else []
+        for base in self._candidate_bases(current_file, level):
+            if resolved := self._resolve_in(base, parts):
+                return resolved
+        return None
+
+    def is_repo_module(
+        self, module_name: str, current_file: str, level: int = 0
+    ) -> bool:
+        """
+        Whether an import points inside the repository, i.e. it is relative or some
+        prefix of the module exists in the repo, even if the rest cannot be resolved.
+        """
+        if level > 0:
+            return True
+        parts = [p for p in module_name.split(" as ")[0].strip().split(".") if p]
+        return any(
+            self.resolve_module(".".join(parts[:i]), current_file)
+            for i in range(len(parts), 0, -1)
+        )
+
+    def resolve_import(
+        self,
+        module_name: str,
+        current_file: str,
+        level: int = 0,
+        names: Optional[List[str]] = None,
+    ) -> List[str]:
+        """
+        Resolves an import to the repository files it depends on. For
+        `from pkg import name`, `name` is resolved as a submodule first and the
+        package itself is only returned for names that are not submodules.
+        Returns an empty list if the import cannot be resolved statically.
+        """
+        module_name = module_name.split(" as ")[0].strip().lstrip(".")
+        resolved = self.resolve_module(module_name, current_file, level)
+        if resolved is None:
+            return []
+
+        files = []
+        package_needed = not names
+        if self._isdir(resolved) or resolved.endswith("__init__.py"):
+            package_dir = (
+                resolved if self._isdir(resolved) else os.path.dirname(resolved)
+            )
+            for name in names or []:
+                if name == "*":
+                    package_needed = True
+                    continue
+                submodule = self._resolve_in(package_dir, [name])
+                if submodule and not self._isdir(submodule):
+                    files.append(submodule)
+                else:
+                    package_needed = True
+        else:
+            package_needed = True
+
+        if package_needed and not self._isdir(resolved):
+            files.insert(0, resolved)
+        return files
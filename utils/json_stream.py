@@ -0,0 +1,112 @@
+import json
+from typing import Any, Dict, List, Optional
+
+
+class IncrementalJSONParser:
+    """
+    Parses the top level of a JSON object as it streams in. Text is fed chunk by
+    chunk; each top-level field is decoded as soon as its value is complete, so a
+    caller can act on e.g. `tool` and `tool_args` before the model has finished
+    the rest of the object. Anything before the first `{` (a code fence or a
+    preamble) is skipped.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        # start offset of the string being scanned (key or value)
+        self._string_start: Optional[int] = None
+        self._key: Optional[str] = None
+        self._expecting_key = True
+        self._value_start: Optional[int] = None
+
+    def has(self, key: str) -> bool:
+        return key in self.fields
+
+    def _finish_value(self, end: int, completed: List[str]):
+        key, raw = self._key, self.buffer[self._value_start : end].strip()
+        self._key = None
+        self._value_start = None
+        self._expecting_key = True
+        try:
+            self.fields[key] = json.loads(raw)
+        except json.JSONDecodeError:
+            # left for the final json.loads of the whole response to report
+            return
+        completed.append(key)
+
+    def feed(self, chunk: str) -> List[str]:
+        """Consumes `chunk` and returns the top-level keys completed by it."""
+        self.buffer += chunk
+        completed = []
+        buffer = self.buffer
+        while self._pos < len(buffer) and not self.complete:
+            char = buffer[self._pos]
+            index = self._pos
+            self._pos += 1
+
+            if not self._started:
+                if char == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._expecting_key:
+                        self._key = json.loads(buffer[self._string_start : index + 1])
+                    elif self._depth == 1 and self._value_start is not None:
+                        # a top-level string value just closed
+                        self._finish_value(index + 1, completed)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+                if (
+                    self._depth == 1
+                    and not self._expecting_key
+                    and self._value_start is None
+                ):
+                    self._value_start = index
+            elif char == ":" and self._depth == 1:
+                self._expecting_key = False
+            elif char in "{[":
+                if self._depth == 1 and self._value_start is None:
+                    self._value_start = index
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1 and self._value_start is not None:
+                    # a top-level object or array value just closed
+                    self._finish_value(index + 1, completed)
+                elif self._depth == 0:
+                    if self._value_start is not None:
+                        # a number, boolean or null ends at the closing brace
+                        self._finish_value(index, completed)
+                    self.complete = True
+            elif char == "," and self._depth == 1:
+                if self._value_start is not None:
+                    self._finish_value(index, completed)
+                self._expecting_key = True
+            elif (
+                self._depth == 1
+                and not self._expecting_key
+                and self._value_start is None
+                and not char.isspace()
+            ):
+                # start of a number, boolean or null
+                self._value_start = index
+        return completed
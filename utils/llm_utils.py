@@ -7,6 +7,9 @@ def get_request_tokens(
     response,
     model: Union[OpenAiChatModels, AnthropicModels],
 ):
+    if response is None:
+        # replayed from the response cache, or a failed call
+        return 0, 0
     if isinstance(model, OpenAiChatModels):
         return response.usage.prompt_tokens, response.usage.completion_tokens
     elif isinstance(model, AnthropicModels):
@@ -0,0 +1,87 @@
+import copy
+import json
+from typing import Any, Dict, List, Optional
+
+
+def compact_json(value: Any) -> str:
+    """JSON for model-facing prompts: no indentation or padding whitespace."""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def state_delta(base: Any, state: Any) -> Optional[Dict]:
+    """
+    Top-level changes from `base` to `state`: changed or added keys of a dict, or
+    the new length and changed items (by index) of a list. None when the two
+    cannot be compared field by field.
+    """
+    if isinstance(base, dict) and isinstance(state, dict):
+        delta = {
+            "changed": {
+                key: value
+                for key, value in state.items()
+                if key not in base or base[key] != value
+            }
+        }
+        removed = [key for key in base if key not in state]
+        if removed:
+            delta["removed"] = removed
+        return delta
+    if isinstance(base, list) and isinstance(state, list):
+        return {
+            "length": len(state),
+            "changed": {
+                str(index): item
+                for index, item in enumerate(state)
+                if index >= len(base) or base[index] != item
+            },
+        }
+    return None
+
+
+class StateTracker:
+    """
+    Decides what an agent tells the model about its working state (the
+    exploration context, the plan) at the start of a turn. Nothing is sent while
+    the state is unchanged since the model last saw it. After a change, only the
+    delta against the last full snapshot in the conversation is sent, which stays
+    valid even if intermediate deltas are trimmed away. A new full snapshot is sent
+    once the delta grows past `rebase_ratio` of the full state, or the previous
+    snapshot is no longer in the conversation.
+    """
+
+    def __init__(self, title: str, rebase_ratio: float = 0.5):
+        self.title = title
+        self.rebase_ratio = rebase_ratio
+        self.reset()
+
+    def reset(self):
+        self._base: Any = None
+        self._base_message: Optional[Dict] = None
+        self._last_sent: Any = None
+
+    def message(self, state: Any, messages: List[Dict]) -> Optional[Dict]:
+        """The state message to append to `messages` this turn, or None."""
+        if self._base_message is not None and not any(
+            message is self._base_message for message in messages
+        ):
+            self.reset()
+        if self._base_message is not None and state == self._last_sent:
+            return None
+
+        snapshot = copy.deepcopy(state)
+        full = f"## {self.title}:\n{compact_json(state)}"
+        delta = state_delta(self._base, state) if self._base_message else None
+        if delta is not None:
+            delta_content = (
+                f"## {self.title} (changes since the last full version):\n"
+                f"{compact_json(delta)}"
+            )
+            if len(delta_content) < len(full) * self.rebase_ratio:
+                self._last_sent = snapshot
+                return {"role": "user", "content": delta_content}
+
+        message = {"role": "user", "content": full}
+        self._base = snapshot
+        self._base_message = message
+        self._last_sent = snapshot
+        return message